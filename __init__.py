@@ -1,6 +1,7 @@
 from .ascii_art_node import ASCIIArtNode
 from .ascii_art_node_v2 import ASCIIArtNodev2
 from .ascii_art_single_font_node import ASCIIArtSinglefontNode
+from .ascii_grid_nodes import ASCIIGridAnalyzeNode, ASCIIGridRenderNode, ASCIIGridTextExportNode
 
 from folder_paths import folder_names_and_paths
 import os
@@ -9,7 +10,10 @@ import os
 NODE_CLASS_MAPPINGS = {
     "ASCIIArtNode": ASCIIArtNode,          # ここにASCIIArtNodeを追加
     "ASCIIArtNodev2": ASCIIArtNodev2,       # 既存のASCIIArtNodev2を維持
-    "ASCIIArtSinglefontNode": ASCIIArtSinglefontNode
+    "ASCIIArtSinglefontNode": ASCIIArtSinglefontNode,
+    "ASCIIGridAnalyzeNode": ASCIIGridAnalyzeNode,    # 解析結果（ASCII_GRID）を出力
+    "ASCIIGridRenderNode": ASCIIGridRenderNode,      # ASCII_GRIDを画像として描画
+    "ASCIIGridTextExportNode": ASCIIGridTextExportNode  # ASCII_GRIDをテキスト（plain / ANSI / HTML）で保存
 }
 
 # font フォルダがすでに登録されているか確認
@@ -0,0 +1,387 @@
+"""
+Rendering engine shared by the ASCII art nodes.
+
+Every node runs the same pipeline in two halves. The analysis loads the
+character sets, enhances and downsamples the batch to one color per grid
+cell and picks the characters and font size of every cell, giving an
+ASCIIGrid. The rendering draws a grid with a font through the glyph atlas
+and writes the frames into the output batch. The nodes only differ in a
+few choices, which are strategies of ASCIIArtEngine:
+
+- the character mapping turns cell colors into the characters drawn in the
+  cell: one per RGB channel (``rgb_triple``), one picked by its position
+  in the set (``brightness``), or one picked by the ink its glyph covers in
+  the font, measured as a whole (``density``) or per sub-block of the cell
+  (``shape``);
+- the size selection picks a multiple of ``font_size_min`` per cell: at
+  random (``random``), larger for bright cells (``brightness_threshold``),
+  always the same (``fixed``) or larger where the image is flat, merging
+  the cells of a 2x2 or 4x4 block into one (``adaptive``);
+- the sampling of the downsampling, whether cells that land on an already
+  used position are skipped, and whether cells are drawn in blocks.
+"""
+import logging
+import os
+from functools import partial
+from typing import Iterator, Optional, Tuple
+import numpy as np
+import torch
+from folder_paths import get_full_path
+from .batching import WorkerPool, frame_mask, write_frame
+from .cache import load_character_sets, load_font
+from .glyph_atlas import GlyphAtlas, cell_positions, render_tiled
+from .glyph_metrics import DESCRIPTOR_SIZE, density_lut, measure_glyphs, nearest_glyphs
+from .incremental import IncrementalRenderer
+from .options import CHAR_MAPPING_NAMES, SIZE_SELECTION_NAMES
+from .preprocess import cell_detail, grid_size, pixelate, resize_masks, to_image_tensor, to_uint8
+from .profiling import count, profile_run, stage, timed
+
+logger = logging.getLogger(__name__)
+
+
+class RGBTripleMapping:
+    """Three characters per cell, one indexed by each of the R, G and B values."""
+    name = "rgb_triple"
+    measures_glyphs = False
+    uses_detail = False
+
+    def indices(self, colors: np.ndarray, ascii_chars: str, glyphs=None, detail: Optional[np.ndarray] = None) -> np.ndarray:
+        return colors.astype(np.int64) * len(ascii_chars) // 256
+
+
+class BrightnessMapping:
+    """One character per cell, indexed by the mean of its R, G and B values."""
+    name = "brightness"
+    measures_glyphs = False
+    uses_detail = False
+
+    def indices(self, colors: np.ndarray, ascii_chars: str, glyphs=None, detail: Optional[np.ndarray] = None) -> np.ndarray:
+        return (colors.mean(axis=-1, keepdims=True) / 255.0 * (len(ascii_chars) - 1)).astype(np.int64)
+
+
+class DensityMapping:
+    """One character per cell, the one whose glyph coverage is closest to the cell's brightness."""
+    name = "density"
+    measures_glyphs = True
+    uses_detail = False
+
+    def indices(self, colors: np.ndarray, ascii_chars: str, glyphs=None, detail: Optional[np.ndarray] = None) -> np.ndarray:
+        coverage, _ = glyphs
+        # The rounded mean of R, G and B indexes a 256-entry table
+        levels = (colors.sum(axis=-1, dtype=np.int64, keepdims=True) + 1) // 3
+        return density_lut(coverage)[levels]
+
+
+class ShapeMapping:
+    """One character per cell, the one whose per-block coverage is nearest to the cell's per-block brightness."""
+    name = "shape"
+    measures_glyphs = True
+    uses_detail = True
+
+    def indices(self, colors: np.ndarray, ascii_chars: str, glyphs=None, detail: Optional[np.ndarray] = None) -> np.ndarray:
+        _, descriptors = glyphs
+        nearest = nearest_glyphs(detail.reshape(-1, detail.shape[-1]), descriptors)
+        return nearest.reshape(*detail.shape[:-1], 1)
+
+
+class RandomSizes:
+    """1x, 2x or 3x ``font_size_min`` at random, drawn once for all frames."""
+    name = "random"
+    merges_cells = False
+
+    def prepare(self, rng: np.random.Generator, shape: Tuple[int, int]) -> Optional[np.ndarray]:
+        return rng.integers(3, size=shape) + 1
+
+    def select(self, colors: np.ndarray, prepared: Optional[np.ndarray]) -> np.ndarray:
+        return np.broadcast_to(prepared, colors.shape[:-1])
+
+
+class BrightnessThresholdSizes:
+    """2x ``font_size_min`` for cells brighter than half, 1x for the others."""
+    name = "brightness_threshold"
+    merges_cells = False
+
+    def prepare(self, rng: np.random.Generator, shape: Tuple[int, int]) -> Optional[np.ndarray]:
+        return None
+
+    def select(self, colors: np.ndarray, prepared: Optional[np.ndarray]) -> np.ndarray:
+        return np.where(colors.mean(axis=-1) / 255.0 > 0.5, 2, 1)
+
+
+class FixedSize:
+    """``font_size_min`` for every cell."""
+    name = "fixed"
+    merges_cells = False
+
+    def prepare(self, rng: np.random.Generator, shape: Tuple[int, int]) -> Optional[np.ndarray]:
+        return None
+
+    def select(self, colors: np.ndarray, prepared: Optional[np.ndarray]) -> np.ndarray:
+        return np.ones(colors.shape[:-1], dtype=np.int64)
+
+
+def grid_blocks(values: np.ndarray, level: int) -> np.ndarray:
+    """The aligned ``level`` x ``level`` blocks of a [B, rows, cols, ...] grid, as [B, rows // level, level, cols // level, level, ...]."""
+    batch, rows, cols = values.shape[:3]
+    rows, cols = rows // level, cols // level
+    return values[:, :rows * level, :cols * level].reshape(batch, rows, level, cols, level, *values.shape[3:])
+
+
+class AdaptiveSizes:
+    """Large glyphs where the image is flat and small ones where it has detail.
+
+    The grid is split into aligned 4x4 and then 2x2 blocks of cells. A block
+    whose cell luma has a standard deviation of at most ``threshold`` is
+    drawn as one cell with a 4x or 2x glyph at its top left cell, in the
+    mean color of the block, and its other cells get size 0 and are not
+    drawn. Cells in no flat block keep 1x ``font_size_min``.
+    """
+    name = "adaptive"
+    merges_cells = True
+    levels = (4, 2)
+
+    def __init__(self, threshold: float = 8.0):
+        self.threshold = threshold
+
+    def prepare(self, rng: np.random.Generator, shape: Tuple[int, int]) -> Optional[np.ndarray]:
+        return None
+
+    def select(self, colors: np.ndarray, prepared: Optional[np.ndarray]) -> np.ndarray:
+        luma = colors.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+        sizes = np.ones(luma.shape, dtype=np.int64)
+        for level in self.levels:
+            # Only blocks not already part of a larger one can merge
+            flat = (grid_blocks(luma, level).std(axis=(2, 4)) <= self.threshold) & (grid_blocks(sizes, level) == 1).all(axis=(2, 4))
+            merged = grid_blocks(sizes, level)
+            merged[np.broadcast_to(flat[:, :, None, :, None], merged.shape)] = 0
+            merged[:, :, 0, :, 0][flat] = level
+        return sizes
+
+
+def merge_cells(values: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    """Set every merged cell of a [B, rows, cols, ...] grid to the mean over the block it is drawn for."""
+    values = values.copy()
+    for level in np.unique(sizes[sizes > 1]).tolist():
+        anchors = grid_blocks(sizes, level)[:, :, 0, :, 0] == level
+        means = grid_blocks(values, level).mean(axis=(2, 4), dtype=np.float32)
+        if values.dtype == np.uint8:
+            means = np.round(means)
+        grid_blocks(values, level)[:, :, 0, :, 0][anchors] = means[anchors]
+    return values
+
+
+def registry(strategies, names) -> dict:
+    """The ``strategies`` by their ``name``, in the order of ``names``, which must name each of them once."""
+    by_name = {strategy.name: strategy for strategy in strategies}
+    if sorted(by_name) != sorted(names) or len(by_name) != len(strategies):
+        raise RuntimeError(f"The strategies {sorted(by_name)} do not match the options {sorted(names)}")
+    return {name: by_name[name] for name in names}
+
+
+CHAR_MAPPINGS = registry((RGBTripleMapping(), BrightnessMapping(), DensityMapping(), ShapeMapping()), CHAR_MAPPING_NAMES)
+
+SIZE_SELECTIONS = registry((RandomSizes(), BrightnessThresholdSizes(), FixedSize(), AdaptiveSizes()), SIZE_SELECTION_NAMES)
+
+
+class ASCIIGrid:
+    """The analysis of a batch: what to draw in every grid cell of every frame.
+
+    ``chars`` holds indices into ``charset``, [B, rows, cols, k] uint8 with
+    the k characters of each cell's text; ``colors`` the [B, rows, cols, 3]
+    uint8 cell colors and ``sizes`` the [B, rows, cols] uint8 multiples of
+    ``font_size_min``, 0 for cells merged into a larger neighbour, which are
+    not drawn. ``image_size`` is the (width, height) of the frames
+    the grid was made from and is drawn at.
+    """
+
+    def __init__(self, chars: np.ndarray, colors: np.ndarray, sizes: np.ndarray, charset: str,
+                 image_size: Tuple[int, int], char_mapping: str, size_selection: str):
+        self.chars = chars
+        self.colors = colors
+        self.sizes = sizes
+        self.charset = charset
+        self.image_size = image_size
+        self.char_mapping = char_mapping
+        self.size_selection = size_selection
+
+    def __len__(self) -> int:
+        return len(self.chars)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.chars.shape[1:3]
+
+    def frame(self, index: int) -> "ASCIIGrid":
+        return ASCIIGrid(self.chars[index:index + 1], self.colors[index:index + 1], self.sizes[index:index + 1],
+                         self.charset, self.image_size, self.char_mapping, self.size_selection)
+
+
+def render_frame(grid: ASCIIGrid, font_path: str, font_size_min: int, unique_positions: bool = False, block: Optional[int] = None,
+                 renderer: Optional[IncrementalRenderer] = None, workers: int = 1, pool: str = "thread",
+                 worker_pool: Optional[WorkerPool] = None) -> np.ndarray:
+    """Render the first frame of ``grid`` as an (H, W, 3) uint8 image."""
+    width, height = grid.image_size
+    rows, cols = grid.shape
+    scale_x = width / cols
+    scale_y = height / rows
+
+    pos_x = cell_positions(cols, width)
+    pos_y = cell_positions(rows, height)
+    if unique_positions:
+        # Cells that land on an already used position are skipped
+        keep_x = np.flatnonzero(np.diff(pos_x, prepend=-1))
+        keep_y = np.flatnonzero(np.diff(pos_y, prepend=-1))
+        grid_y, grid_x = (axis.ravel() for axis in np.meshgrid(keep_y, keep_x, indexing='ij'))
+    else:
+        grid_y, grid_x = np.indices((rows, cols)).reshape(2, -1)
+    drawn = grid.sizes[0, grid_y, grid_x] > 0
+    grid_y, grid_x = grid_y[drawn], grid_x[drawn]
+
+    chars = grid.chars[0, grid_y, grid_x].astype(np.int64)
+    colors = grid.colors[0, grid_y, grid_x]
+    multiples = grid.sizes[0, grid_y, grid_x].astype(np.int64)
+
+    # Rasterize each distinct (size, text) once and look cells up by index
+    n = len(grid.charset)
+    keys = multiples
+    for column in chars.T:
+        keys = keys * n + column
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    count("cells_drawn", len(keys))
+    count("glyphs", len(unique_keys))
+
+    atlas = renderer.atlas if renderer is not None else GlyphAtlas()
+    glyph_ids = np.empty(len(unique_keys), dtype=np.int64)
+    fonts = {}
+    with stage("glyphs"):
+        for i, key in enumerate(unique_keys.tolist()):
+            text = []
+            for _ in range(chars.shape[1]):
+                key, index = divmod(key, n)
+                text.append(grid.charset[index])
+            if key not in fonts:
+                fonts[key] = load_font(font_path, font_size_min * key)
+            glyph_ids[i] = atlas.glyph_id(fonts[key], "".join(reversed(text)), charset=grid.charset)
+        atlas.save()
+
+    render = renderer.render if renderer is not None else partial(render_tiled, atlas, workers=workers, pool=pool, worker_pool=worker_pool)
+    return render((width, height), pos_x[grid_x], pos_y[grid_y], glyph_ids[inverse.ravel()],
+                  colors, grid_x, grid_y, (scale_x, scale_y), block=block)
+
+
+def render_frames(grid: ASCIIGrid, font_path: str, font_size_min: int, unique_positions: bool = False, block: Optional[int] = None,
+                  workers: int = 1, pool: str = "thread", incremental: bool = False, change_tolerance: int = 0,
+                  name: str = "ASCIIArt") -> Iterator[np.ndarray]:
+    """Yield the rendered frames of ``grid`` in order."""
+    render = partial(render_frame, font_path=font_path, font_size_min=font_size_min, unique_positions=unique_positions, block=block)
+    frames = [grid.frame(i) for i in range(len(grid))]
+    # Made up front so that an unknown pool is rejected in incremental mode too
+    worker_pool = WorkerPool(workers, pool)
+    if incremental:
+        # Each frame is drawn over the previous one, so frames are rendered in order
+        renderer = IncrementalRenderer(change_tolerance)
+        yield from (render(frame, renderer=renderer) for frame in frames)
+        logger.info("%s: incremental rendering skipped %d of %d cells", name, renderer.cells_skipped, renderer.cells_total)
+        count("cells_skipped", renderer.cells_skipped)
+    else:
+        with worker_pool:
+            if len(frames) == 1:
+                # A single image is split into tiles rendered in parallel instead
+                yield render(frames[0], workers=workers, pool=pool, worker_pool=worker_pool)
+            else:
+                yield from worker_pool.map(partial(render, workers=1, pool=pool), frames)
+
+
+def composite(frames: Iterator[np.ndarray], grid: ASCIIGrid, image: Optional[torch.Tensor] = None, masks: Optional[np.ndarray] = None) -> torch.Tensor:
+    """Write rendered frames into one float32 IMAGE batch, blended over ``image`` where ``masks`` are given."""
+    width, height = grid.image_size
+    if masks is not None and image is None:
+        raise ValueError("A mask needs the source image to blend the ASCII art over")
+
+    # Frames are written into one float32 batch as they arrive
+    with stage("tensor"):
+        final_image_tensor = torch.empty((len(grid), height, width, 3), dtype=torch.float32)
+    count("output_bytes", final_image_tensor.nelement() * final_image_tensor.element_size())
+    for i, ascii_image in enumerate(timed("render", frames)):
+        with stage("composite"):
+            frame = None if masks is None else to_uint8(image[i % len(image)]).cpu()
+            write_frame(final_image_tensor[i], ascii_image, frame, frame_mask(masks, i))
+    return final_image_tensor
+
+
+class ASCIIArtEngine:
+    """The node pipeline, configured by a character mapping and a size selection.
+
+    ``sampling`` is passed to ``pixelate``. With ``unique_positions`` a cell
+    whose pixel position equals the previous cell's is skipped, and with
+    ``block`` cells are drawn block by block instead of in raster order.
+    The ``density`` and ``shape`` mappings measure glyphs, so their analysis
+    needs the font and ``font_size_min`` the grid will be drawn with.
+    """
+
+    def __init__(self, name: str, char_mapping: str, size_selection: str, sampling: str = "corner",
+                 unique_positions: bool = False, block: Optional[int] = None):
+        self.name = name
+        self.char_mapping = char_mapping
+        self.size_selection = size_selection
+        self.sampling = sampling
+        self.unique_positions = unique_positions
+        self.block = block
+
+    def analyze(self, image, pixel_size: int, aspect_ratio_correction: float, ascii_chars_filename: str, brightness: float, contrast: float, seed: int,
+                font_path: Optional[str] = None, font_size_min: Optional[int] = None, char_mapping: Optional[str] = None,
+                size_selection: Optional[str] = None, detail_threshold: Optional[float] = None) -> ASCIIGrid:
+        char_mapping = char_mapping or self.char_mapping
+        mapping = CHAR_MAPPINGS[char_mapping]
+        size_selection_name = size_selection or self.size_selection
+        size_selection = SIZE_SELECTIONS[size_selection_name]
+        if isinstance(size_selection, AdaptiveSizes) and detail_threshold is not None:
+            size_selection = AdaptiveSizes(detail_threshold)
+        if mapping.measures_glyphs and (font_path is None or font_size_min is None):
+            raise ValueError(f"The {char_mapping} character mapping needs a font and font_size_min to measure the glyphs")
+        ascii_chars_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ascii_chars_filename)
+
+        # Load ASCII character sets
+        with stage("load"):
+            ascii_sets = load_character_sets(ascii_chars_file_path)
+
+        # Enhance and downsample the whole batch on the device it is on
+        with stage("tensor"):
+            image = to_image_tensor(image)
+        height, width = image.shape[1:3]
+        count("input_bytes", image.nelement() * image.element_size())
+        with stage("preprocess"):
+            colors = pixelate(image, pixel_size, aspect_ratio_correction, brightness, contrast, sampling=self.sampling)
+
+            # The seed picks the set and any random choices per grid cell, shared by all frames and tiles
+            rng = np.random.default_rng(seed)
+            chosen_set = ascii_sets[rng.integers(len(ascii_sets))]
+            if len(chosen_set) > 256:
+                raise ValueError(f"Character sets can have at most 256 characters, got {len(chosen_set)}")
+            prepared = size_selection.prepare(rng, colors.shape[1:3])
+            sizes = size_selection.select(colors, prepared).astype(np.uint8)
+            glyphs = detail = None
+            if mapping.measures_glyphs:
+                glyphs = measure_glyphs(load_font(font_path, font_size_min), chosen_set)
+            if mapping.uses_detail:
+                detail = cell_detail(image, *grid_size(height, width, pixel_size, aspect_ratio_correction), brightness, contrast, DESCRIPTOR_SIZE)
+            if size_selection.merges_cells:
+                # Merged cells are drawn in the mean color, and matched on the mean detail, of their block
+                colors = merge_cells(colors, sizes)
+                detail = None if detail is None else merge_cells(detail, sizes)
+            chars = mapping.indices(colors, chosen_set, glyphs, detail).astype(np.uint8)
+        count("cells", chars.shape[0] * chars.shape[1] * chars.shape[2])
+        count("grid_bytes", chars.nbytes + colors.nbytes + sizes.nbytes)
+        return ASCIIGrid(chars, colors, sizes, chosen_set, (width, height), char_mapping, size_selection_name)
+
+    def generate(self, image, pixel_size: int, font_size_min: int, aspect_ratio_correction: float, font_name: str, ascii_chars_filename: str, brightness: float, contrast: float, seed: int, mask=None, *, workers: int = 1, pool: str = "thread", incremental: bool = False, change_tolerance: int = 0, char_mapping: Optional[str] = None, profile: bool = False, size_selection: Optional[str] = None, detail_threshold: Optional[float] = None) -> torch.Tensor:
+        with profile_run(self.name, profile):
+            image = to_image_tensor(image)
+            font_path = get_full_path("font", font_name)
+            grid = self.analyze(image, pixel_size, aspect_ratio_correction, ascii_chars_filename, brightness, contrast, seed, font_path, font_size_min, char_mapping,
+                                size_selection, detail_threshold)
+            with stage("preprocess"):
+                masks = resize_masks(mask, *image.shape[1:3])
+            frames = render_frames(grid, font_path, font_size_min, self.unique_positions, self.block,
+                                   workers, pool, incremental, change_tolerance, self.name)
+            return composite(frames, grid, image, masks)
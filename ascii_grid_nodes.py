@@ -0,0 +1,105 @@
+import os
+from folder_paths import get_full_path, get_output_directory, get_save_image_path
+from .options import CHAR_MAPPING_NAMES, PROFILE_INPUTS, RENDER_INPUTS, SAMPLINGS, SIZE_SELECTION_NAMES, TEXT_FORMATS, font_list
+
+class CustomNode:
+    pass
+
+class ASCIIGridAnalyzeNode(CustomNode):
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "image": ("IMAGE", ),
+                "pixel_size": ("INT", {"default": 20, "min": 1, "max": 100}),
+                "aspect_ratio_correction": ("FLOAT", {"default": 1.0, "min": 0.1, "max": 10.0}),
+                "ascii_chars_filename": ("STRING", {"default": "set5.txt"}),
+                "brightness": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 3.0}),
+                "contrast": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 3.0}),
+                "seed": ("INT", {"default": 0, "min": 0, "max": 100000}),
+                "char_mapping": (CHAR_MAPPING_NAMES, {"default": "brightness", "tooltip": "How cell colors choose the characters"}),
+                "size_selection": (SIZE_SELECTION_NAMES, {"default": "fixed", "tooltip": "How each cell's font size is chosen, as a multiple of font_size_min"}),
+                "sampling": (SAMPLINGS, {"default": "corner", "tooltip": "Pixel of each cell its color is taken from"}),
+            },
+            "optional": {
+                "font_name": (font_list(), {"tooltip": "Font the density and shape mappings measure glyphs in"}),
+                "font_size_min": ("INT", {"default": 20, "min": 1, "max": 100, "tooltip": "Font size the density and shape mappings measure glyphs at"}),
+                "detail_threshold": ("FLOAT", {"default": 8.0, "min": 0.0, "max": 128.0, "tooltip": "With the adaptive size selection, blocks whose luma varies less than this (standard deviation, 0-255) are merged"}),
+                **PROFILE_INPUTS,
+            }
+        }
+
+    RETURN_TYPES = ("ASCII_GRID",)
+    FUNCTION = "analyze"
+
+    def analyze(self, image, pixel_size: int, aspect_ratio_correction: float, ascii_chars_filename: str, brightness: float, contrast: float, seed: int, char_mapping: str, size_selection: str, sampling: str, font_name: str = None, font_size_min: int = 20, profile: bool = False, detail_threshold: float = 8.0):
+        from .ascii_engine import ASCIIArtEngine
+        from .profiling import profile_run
+        engine = ASCIIArtEngine("ASCIIGridAnalyzeNode", char_mapping, size_selection, sampling)
+        font_path = get_full_path("font", font_name) if font_name else None
+        with profile_run("ASCIIGridAnalyzeNode", profile):
+            return (engine.analyze(image, pixel_size, aspect_ratio_correction, ascii_chars_filename, brightness, contrast, seed, font_path, font_size_min,
+                                   detail_threshold=detail_threshold), )
+
+class ASCIIGridRenderNode(CustomNode):
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "ascii_grid": ("ASCII_GRID", ),
+                "font_size_min": ("INT", {"default": 20, "min": 1, "max": 100}),
+                "font_name": (font_list(), {"tooltip": "Select a font from the font directory"}),
+                "skip_duplicate_positions": ("BOOLEAN", {"default": False, "tooltip": "Skip cells that land on the pixel position of the previous cell"}),
+                "block_size": ("INT", {"default": 0, "min": 0, "max": 100, "tooltip": "Draw cells in blocks of this many rows and columns (0 = row by row)"}),
+            },
+            "optional": {
+                "image": ("IMAGE", {"tooltip": "Source image the ASCII art is blended over where the mask is set"}),
+                "mask": ("MASK",),
+                **RENDER_INPUTS,
+                **PROFILE_INPUTS,
+            }
+        }
+
+    RETURN_TYPES = ("IMAGE",)
+    FUNCTION = "render"
+
+    def render(self, ascii_grid, font_size_min: int, font_name: str, skip_duplicate_positions: bool, block_size: int, image=None, mask=None, workers: int = 1, pool: str = "thread", incremental: bool = False, change_tolerance: int = 0, profile: bool = False):
+        from .ascii_engine import composite, render_frames
+        from .preprocess import resize_masks, to_image_tensor
+        from .profiling import profile_run, stage
+        width, height = ascii_grid.image_size
+        if image is not None:
+            image = to_image_tensor(image)
+            if tuple(image.shape[1:3]) != (height, width):
+                raise ValueError(f"The image is {image.shape[2]}x{image.shape[1]}, but the ASCII grid was made from a {width}x{height} image")
+        with profile_run("ASCIIGridRenderNode", profile):
+            with stage("preprocess"):
+                masks = resize_masks(mask, height, width)
+            frames = render_frames(ascii_grid, get_full_path("font", font_name), font_size_min, skip_duplicate_positions, block_size or None,
+                                   workers, pool, incremental, change_tolerance, "ASCIIGridRenderNode")
+            return (composite(frames, ascii_grid, image, masks), )
+
+class ASCIIGridTextExportNode(CustomNode):
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "ascii_grid": ("ASCII_GRID", ),
+                "text_format": (list(TEXT_FORMATS), {"default": "html", "tooltip": "plain text, text with 24-bit ANSI colors, or HTML"}),
+                "filename_prefix": ("STRING", {"default": "ascii_art"}),
+            }
+        }
+
+    RETURN_TYPES = ("STRING",)
+    RETURN_NAMES = ("path",)
+    FUNCTION = "export"
+    OUTPUT_NODE = True
+
+    def export(self, ascii_grid, text_format: str, filename_prefix: str):
+        from .text_export import write_text
+        # Frames are streamed to the file, so no image is rendered and memory stays bounded.
+        # get_save_image_path refuses prefixes that leave the output folder and picks the counter.
+        folder, filename, counter, _, _ = get_save_image_path(filename_prefix, get_output_directory())
+        path = os.path.join(folder, f"{filename}_{counter:05}_.{TEXT_FORMATS[text_format]}")
+        write_text(ascii_grid, path, text_format)
+        return (path, )
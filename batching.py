@@ -0,0 +1,126 @@
+"""
+Batch helpers shared by the ASCII art nodes.
+
+ComfyUI passes IMAGE inputs as [B,H,W,C] tensors and MASK inputs as [B,H,W]
+tensors; a video loader produces one entry per frame. These helpers spread
+the per-frame work over a pool and assemble the rendered frames into the
+float32 IMAGE batch.
+
+Peak memory per frame, measured on 4K frames, besides the 12 bytes per
+pixel of its slot in the output batch:
+
+- preprocessing: about 3 bytes per pixel; the full-resolution temporaries
+  (the uint8 frame and its luma) are made a few rows at a time.
+- rendering: the uint8 frame (3 bytes per pixel) and the renderer's padded
+  canvas, about 5 bytes per pixel together. A tiled frame is the final
+  image plus the padded canvases of the tiles being drawn, about 6 bytes
+  per pixel, and each worker blends at most glyph_atlas.BLEND_PIXELS ink
+  pixels at once, which adds about 30 MB per worker for large blocks.
+- compositing: the rendered frame and, with a mask, the uint8 source frame
+  and mask, about 5 bytes per pixel; the float32 copies of the source and
+  weights are made BLEND_PIXELS at a time.
+
+The incremental renderer also keeps the previous canvas and builds int32
+coverage maps of the redrawn region, about 15 bytes per pixel while a
+frame is drawn.
+"""
+import os
+import multiprocessing
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterator, Optional, Sequence
+import numpy as np
+import torch
+from .options import POOL_TYPES
+
+# Pixels of a masked frame blended at once
+BLEND_PIXELS = 1 << 20
+
+
+def frame_mask(masks: Optional[np.ndarray], index: int) -> Optional[np.ndarray]:
+    # A shorter mask batch (usually a single mask) is repeated over the frames
+    if masks is None:
+        return None
+    return masks[index % len(masks)]
+
+
+def resolve_workers(workers: int, jobs: int) -> int:
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, jobs))
+
+
+def can_fork() -> bool:
+    # Forking a process that has started threads or loaded system frameworks
+    # is only dependable on Linux; macOS documents crashes for it.
+    return sys.platform.startswith("linux") and "fork" in multiprocessing.get_all_start_methods()
+
+
+class WorkerPool:
+    """An executor shared by all parallel maps of one node run.
+
+    The executor is created by the first map that has more than one job,
+    sized for that map, and shut down when the pool is closed. ``workers``
+    of 0 uses one worker per CPU core. The process pool forks the running
+    interpreter so that the mapped functions and the loaded node modules do
+    not have to be importable by name; where forking is not safe (anything
+    but Linux) a thread pool is used instead.
+    """
+
+    def __init__(self, workers: int = 1, pool: str = "thread"):
+        if pool not in POOL_TYPES:
+            raise ValueError(f"Unknown pool: {pool}. Expected one of {', '.join(POOL_TYPES)}")
+        self.workers = workers
+        self.pool = pool
+        self._executor: Optional[Executor] = None
+
+    def __enter__(self) -> "WorkerPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def map(self, func: Callable, jobs: Sequence, workers: Optional[int] = None) -> Iterator:
+        """Yield ``func`` applied to every job, in order, using up to ``workers`` (by default the pool's) workers."""
+        workers = resolve_workers(self.workers if workers is None else workers, len(jobs))
+        if workers == 1:
+            yield from map(func, jobs)
+            return
+        if self._executor is None:
+            if self.pool == "process" and can_fork():
+                self._executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"))
+            else:
+                self._executor = ThreadPoolExecutor(workers)
+        yield from self._executor.map(func, jobs)
+
+
+def map_frames(func: Callable, jobs: Sequence, workers: int = 1, pool: str = "thread") -> Iterator:
+    """Yield ``func`` applied to every job, in order, in a WorkerPool of its own."""
+    with WorkerPool(workers, pool) as worker_pool:
+        yield from worker_pool.map(func, jobs)
+
+
+def write_frame(out: torch.Tensor, ascii_image: np.ndarray, frame: Optional[torch.Tensor] = None, mask: Optional[np.ndarray] = None) -> None:
+    """Write a rendered uint8 frame into its float32 [H,W,3] slot of the output.
+
+    With a mask the ASCII art is blended over the uint8 source ``frame``,
+    ``frame + (ascii - frame) * mask``, in place in the output slot.
+    """
+    ascii_image = torch.from_numpy(ascii_image)
+    if mask is None:
+        out.copy_(ascii_image)
+        out.div_(255)
+        return
+    # Blended a few rows at a time, so the float32 copies of the source and
+    # the weights stay small
+    step = max(1, BLEND_PIXELS // max(1, out.shape[1]))
+    for start in range(0, len(out), step):
+        rows = slice(start, start + step)
+        source = frame[rows].to(torch.float32)
+        weight = torch.from_numpy(mask[rows]).unsqueeze(-1).to(torch.float32).div_(255 * 255)
+        out[rows].copy_(ascii_image[rows]).sub_(source).mul_(weight).add_(source, alpha=1 / 255)
@@ -0,0 +1,57 @@
+"""
+Minimal stand-in for ComfyUI's ``folder_paths``, enough to load and run the
+ASCII art nodes outside ComfyUI. The package registers its ``font`` folder
+here on import, as it does in ComfyUI.
+"""
+import os
+from typing import List, Optional, Tuple
+
+folder_names_and_paths = {}
+
+
+def get_filename_list(folder_name: str) -> List[str]:
+    paths, extensions = folder_names_and_paths.get(folder_name, ([], set()))
+    return sorted(name for path in paths if os.path.isdir(path) for name in os.listdir(path)
+                  if os.path.splitext(name)[1].lower() in extensions)
+
+
+def get_full_path(folder_name: str, filename: str) -> Optional[str]:
+    for path in folder_names_and_paths.get(folder_name, ([], set()))[0]:
+        full_path = os.path.join(path, filename)
+        if os.path.isfile(full_path):
+            return full_path
+    return None
+
+
+def get_output_directory() -> str:
+    return os.path.join(os.getcwd(), "output")
+
+
+def get_save_image_path(filename_prefix: str, output_dir: str, image_width: int = 0, image_height: int = 0) -> Tuple[str, str, int, str, str]:
+    """Return the folder, file name, next free counter, subfolder and prefix for saving under ``output_dir``.
+
+    Like ComfyUI, files are expected to be named ``<filename>_<counter:05>_.<ext>``,
+    and prefixes that lead outside ``output_dir`` are refused.
+    """
+    def map_filename(filename: str) -> Tuple[int, str]:
+        prefix_len = len(os.path.basename(filename_prefix))
+        try:
+            digits = int(filename[prefix_len + 1:].split('_')[0])
+        except ValueError:
+            digits = 0
+        return digits, filename[:prefix_len + 1]
+
+    subfolder = os.path.dirname(os.path.normpath(filename_prefix))
+    filename = os.path.basename(os.path.normpath(filename_prefix))
+    full_output_folder = os.path.join(output_dir, subfolder)
+    if os.path.commonpath((output_dir, os.path.abspath(full_output_folder))) != output_dir:
+        raise Exception(f"Saving image outside the output folder is not allowed.\n full_output_folder: {os.path.abspath(full_output_folder)}\n output_dir: {output_dir}")
+    try:
+        counter = max(digits for digits, prefix in map(map_filename, os.listdir(full_output_folder))
+                      if os.path.normcase(prefix[:-1]) == os.path.normcase(filename) and prefix[-1:] == "_") + 1
+    except ValueError:
+        counter = 1
+    except FileNotFoundError:
+        os.makedirs(full_output_folder, exist_ok=True)
+        counter = 1
+    return full_output_folder, filename, counter, subfolder, filename_prefix
@@ -0,0 +1,300 @@
+"""
+Benchmark harness for the ASCII art nodes.
+
+Runs ASCIIArtNode, ASCIIArtNodev2 and ASCIIArtSinglefontNode outside
+ComfyUI, using the ``folder_paths`` stub next to this file, over the
+product of the chosen resolutions, pixel sizes, batch sizes, character set
+files and mask settings. Besides node names, ``--nodes`` accepts
+``char_mapping+size_selection`` pairs such as ``brightness+random`` to run
+one combination of engine strategies on its own. Each case runs in its own subprocess so that its
+peak RSS is measured in isolation. Reported per case: the wall time of
+every stage (load, tensor, preprocess, glyphs, render, composite), frames/s,
+cells/s and the peak RSS, as the median over the repeated runs after a
+cold first run. Every run also measures, in a fresh interpreter, how long
+importing the package and building the node inputs takes, as ComfyUI does
+at startup, and which heavy modules that loads.
+
+    python benchmarks/run_benchmarks.py                       # quick matrix
+    python benchmarks/run_benchmarks.py --preset full --output results.json
+    python benchmarks/run_benchmarks.py --compare baseline.json --output new.json
+
+With ``--compare`` the results are matched to an earlier ``--output`` file
+and any case slower by more than ``--threshold`` is reported as a
+regression, which also makes the exit status non-zero.
+"""
+import argparse
+import importlib.util
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(BENCH_DIR)
+PACKAGE_NAME = "ascii_art_nodes"
+
+NODES = ["ASCIIArtNode", "ASCIIArtNodev2", "ASCIIArtSinglefontNode"]
+SETS = sorted(name for name in os.listdir(PACKAGE_DIR) if name.startswith("set") and name.endswith(".txt"))
+
+PRESETS = {
+    "quick": {
+        "resolutions": ["512x512", "1920x1080"],
+        "pixel_sizes": [8],
+        "batches": [1, 8],
+        "sets": ["set1.txt"],
+        "masks": [False],
+    },
+    "full": {
+        "resolutions": ["512x512", "1024x1024", "1920x1080", "3840x2160"],
+        "pixel_sizes": [2, 4, 8, 16, 40],
+        "batches": [1, 8, 64],
+        "sets": SETS,
+        "masks": [False, True],
+    },
+}
+
+
+def load_package():
+    """Import the node package under a fixed name with the folder_paths stub."""
+    if PACKAGE_NAME in sys.modules:
+        return sys.modules[PACKAGE_NAME]
+    if BENCH_DIR not in sys.path:
+        sys.path.insert(0, BENCH_DIR)
+    spec = importlib.util.spec_from_file_location(PACKAGE_NAME, os.path.join(PACKAGE_DIR, "__init__.py"),
+                                                  submodule_search_locations=[PACKAGE_DIR])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = package
+    spec.loader.exec_module(package)
+    return package
+
+
+def peak_rss() -> int:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def make_inputs(case: dict):
+    import numpy as np
+    import torch
+
+    width, height = (int(value) for value in case["resolution"].split("x"))
+    batch = case["batch"]
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([xx / width, yy / height, (xx + yy) / (width + height)], axis=-1)
+    image = torch.empty((batch, height, width, 3), dtype=torch.float32)
+    for i in range(batch):
+        # Each frame drifts a little, like consecutive video frames
+        noise = rng.normal(0, 0.08, (height, width, 3)).astype(np.float32)
+        image[i] = torch.from_numpy(np.clip(base + noise + 0.02 * i, 0, 1))
+    mask = None
+    if case["mask"]:
+        radius = np.hypot(xx / width - 0.5, yy / height - 0.5)
+        mask = torch.from_numpy(np.clip(1.5 - 3 * radius, 0, 1)).expand(batch, height, width).contiguous()
+    return image, mask
+
+
+def run_case(case: dict) -> dict:
+    """Run one case in this process and return its measurements."""
+    package = load_package()
+    profiling = importlib.import_module(f"{PACKAGE_NAME}.profiling")
+    preprocess = importlib.import_module(f"{PACKAGE_NAME}.preprocess")
+
+    if case["node"] in package.NODE_CLASS_MAPPINGS:
+        generate = package.NODE_CLASS_MAPPINGS[case["node"]]().generate_ascii_art
+    else:
+        ascii_engine = importlib.import_module(f"{PACKAGE_NAME}.ascii_engine")
+        char_mapping, size_selection = case["node"].split("+")
+        generate = ascii_engine.ASCIIArtEngine(case["node"], char_mapping, size_selection).generate
+    image, mask = make_inputs(case)
+    height, width = image.shape[1:3]
+    rows, cols = preprocess.grid_size(height, width, case["pixel_size"], 1.0)
+    args = dict(image=image, pixel_size=case["pixel_size"], font_size_min=case["font_size"], aspect_ratio_correction=1.0,
+                font_name=case["font"], ascii_chars_filename=case["set"], brightness=1.0, contrast=1.0, seed=0,
+                mask=mask, workers=case["workers"], pool=case["pool"])
+
+    runs = []
+    for _ in range(case["repeat"] + 1):
+        with profiling.StageTimer() as timer:
+            start = time.perf_counter()
+            generate(**args)
+            elapsed = time.perf_counter() - start
+        runs.append((elapsed, timer.as_dict()))
+
+    (cold, _), runs = runs[0], runs[1:]
+    seconds = statistics.median(elapsed for elapsed, _ in runs)
+    stages = {name: statistics.median(stage[name] for _, stage in runs) for name in runs[0][1]}
+    return {
+        **case,
+        "cells": rows * cols * case["batch"],
+        "cold_seconds": cold,
+        "seconds": seconds,
+        "stages": stages,
+        "frames_per_second": case["batch"] / seconds,
+        "cells_per_second": rows * cols * case["batch"] / seconds,
+        "peak_rss": peak_rss(),
+    }
+
+
+def measure_import() -> dict:
+    """Import the package and build every node's inputs in this process, which must not have imported it yet."""
+    start = time.perf_counter()
+    package = load_package()
+    imported = time.perf_counter()
+    for node in package.NODE_CLASS_MAPPINGS.values():
+        node.INPUT_TYPES()
+    listed = time.perf_counter()
+    # The second listing finds the font list cached
+    for node in package.NODE_CLASS_MAPPINGS.values():
+        node.INPUT_TYPES()
+    return {
+        "import_seconds": imported - start,
+        "input_types_seconds": listed - imported,
+        "cached_input_types_seconds": time.perf_counter() - listed,
+        "heavy_modules": [name for name in ("torch", "numpy", "PIL") if name in sys.modules],
+    }
+
+
+def import_isolated() -> dict:
+    process = subprocess.run([sys.executable, os.path.abspath(__file__), "--import-time"], capture_output=True, text=True)
+    if process.returncode != 0:
+        return {"error": process.stderr.strip().splitlines()[-1] if process.stderr.strip() else f"exit status {process.returncode}"}
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def case_key(case: dict) -> tuple:
+    return tuple(case[name] for name in ("node", "resolution", "pixel_size", "batch", "set", "mask", "font", "font_size", "workers", "pool"))
+
+
+def build_cases(options) -> list:
+    preset = PRESETS[options.preset]
+    axes = {name: getattr(options, name) or preset[name] for name in preset}
+    cases, skipped = [], []
+    for node, resolution, pixel_size, batch, set_name, mask in itertools.product(
+            options.nodes or NODES, axes["resolutions"], axes["pixel_sizes"], axes["batches"], axes["sets"], axes["masks"]):
+        case = {"node": node, "resolution": resolution, "pixel_size": pixel_size, "batch": batch, "set": set_name,
+                "mask": mask, "font": options.font, "font_size": options.font_size or max(pixel_size, 4),
+                "workers": options.workers, "pool": options.pool, "repeat": options.repeat}
+        width, height = (int(value) for value in resolution.split("x"))
+        (skipped if width * height * batch > options.max_megapixels * 1e6 else cases).append(case)
+    return cases, skipped
+
+
+def run_isolated(case: dict) -> dict:
+    process = subprocess.run([sys.executable, os.path.abspath(__file__), "--case", json.dumps(case)],
+                             capture_output=True, text=True)
+    if process.returncode != 0:
+        return {**case, "error": process.stderr.strip().splitlines()[-1] if process.stderr.strip() else f"exit status {process.returncode}"}
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def compare(results: list, baseline_path: str, threshold: float) -> list:
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = {case_key(result): result for result in json.load(file)["results"] if "seconds" in result}
+    regressions = []
+    for result in results:
+        previous = baseline.get(case_key(result))
+        if previous is None or "seconds" not in result:
+            continue
+        result["baseline_seconds"] = previous["seconds"]
+        result["change"] = result["seconds"] / previous["seconds"] - 1
+        if result["change"] > threshold:
+            regressions.append(result)
+    return regressions
+
+
+def describe(result: dict) -> str:
+    name = f"{result['node']:<23} {result['resolution']:>9} ps={result['pixel_size']:<2} b={result['batch']:<2} {result['set']} mask={int(result['mask'])}"
+    if "error" in result:
+        return f"{name}  ERROR {result['error']}"
+    stages = " ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in result["stages"].items())
+    line = (f"{name}  {result['seconds'] * 1000:8.1f} ms  {result['frames_per_second']:7.2f} frames/s  "
+            f"{result['cells_per_second'] / 1e6:6.2f} Mcells/s  rss={(result['peak_rss'] or 0) / 2 ** 20:.0f}MiB  {stages}")
+    if "change" in result:
+        line += f"  {result['change']:+.1%} vs baseline"
+    return line
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0], formatter_class=argparse.RawDescriptionHelpFormatter)
+    split = lambda convert: lambda text: [convert(value) for value in text.split(",")]
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick", help="base matrix; the options below override its axes")
+    parser.add_argument("--nodes", type=split(str), help=f"comma-separated, from {','.join(NODES)} or char_mapping+size_selection pairs")
+    parser.add_argument("--resolutions", type=split(str), help="comma-separated WIDTHxHEIGHT, e.g. 512x512,3840x2160")
+    parser.add_argument("--pixel-sizes", dest="pixel_sizes", type=split(int))
+    parser.add_argument("--batches", type=split(int))
+    parser.add_argument("--sets", type=lambda text: SETS if text == "all" else split(str)(text), help="comma-separated set files, or all")
+    parser.add_argument("--masks", type=split(lambda value: value.lower() in ("1", "true", "mask")), help="comma-separated, e.g. 0,1")
+    parser.add_argument("--font", default="Chewy-Regular.ttf")
+    parser.add_argument("--font-size", dest="font_size", type=int, help="font_size_min; defaults to the pixel size")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--pool", choices=["thread", "process"], default="thread")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case after the cold run")
+    parser.add_argument("--max-megapixels", dest="max_megapixels", type=float, default=256,
+                        help="skip cases whose whole batch has more pixels than this")
+    parser.add_argument("--no-isolate", dest="isolate", action="store_false", help="run every case in this process")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown reported as a regression (0.1 = 10%%)")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--import-time", dest="import_time", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    options = parse_args(argv)
+    if options.case:
+        print(json.dumps(run_case(json.loads(options.case))))
+        return 0
+    if options.import_time:
+        print(json.dumps(measure_import()))
+        return 0
+
+    startup = import_isolated()
+    if "error" in startup:
+        print(f"import  ERROR {startup['error']}", file=sys.stderr)
+    else:
+        print(f"import  {startup['import_seconds'] * 1000:.1f} ms  INPUT_TYPES {startup['input_types_seconds'] * 1000:.1f} ms "
+              f"(cached {startup['cached_input_types_seconds'] * 1000:.1f} ms)  heavy modules: {', '.join(startup['heavy_modules']) or 'none'}",
+              file=sys.stderr, flush=True)
+
+    cases, skipped = build_cases(options)
+    for case in skipped:
+        print(f"skipped {case['node']} {case['resolution']} batch {case['batch']}: over --max-megapixels", file=sys.stderr)
+
+    results = []
+    for case in cases:
+        result = run_isolated(case) if options.isolate else run_case(case)
+        results.append(result)
+        print(describe(result), file=sys.stderr, flush=True)
+
+    regressions = compare(results, options.compare, options.threshold) if options.compare else []
+    for result in regressions:
+        print(f"REGRESSION {describe(result)}", file=sys.stderr)
+
+    report = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "import": startup,
+        "results": results,
+        "skipped": skipped,
+    }
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    return 1 if regressions or "error" in startup or any("error" in result for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
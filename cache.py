@@ -0,0 +1,124 @@
+"""
+Shared, bounded LRU cache for fonts, character sets and rasterized glyphs.
+
+Entries are keyed by (kind, path, mtime, ...) so a font or set file that
+changes on disk is reloaded on its next use, and entries of older versions
+of that file are dropped. The cache is bounded by entry count and by an
+estimate of the bytes held, evicting the least recently used entries first,
+and counts hits and misses per kind.
+"""
+import os
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Tuple
+from PIL import ImageFont
+import numpy as np
+
+MAX_ENTRIES = 16384
+MAX_BYTES = 256 << 20
+
+
+class LRUCache:
+    """Thread-safe LRU mapping bounded by entry count and total bytes."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = Counter()
+        self.misses = Counter()
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: Tuple, load: Callable[[], Any], nbytes: Callable[[Any], int]) -> Any:
+        """Return the entry for ``key``, calling ``load`` on a miss.
+
+        Keys start with (kind, path, version). Seeing a new version of a
+        path drops every entry made from its previous versions.
+        """
+        kind, path, version = key[:3]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits[kind] += 1
+                return entry[0]
+
+            self.misses[kind] += 1
+            if self._versions.get(path, version) != version:
+                self.invalidate(path)
+            self._versions[path] = version
+
+            value = load()
+            size = nbytes(value)
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+            return value
+
+    def invalidate(self, path: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == path]:
+                self._bytes -= self._entries.pop(key)[1]
+            self._versions.pop(path, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            kinds = sorted(set(self.hits) | set(self.misses))
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+                "hits": {kind: self.hits[kind] for kind in kinds},
+                "misses": {kind: self.misses[kind] for kind in kinds},
+            }
+
+
+CACHE = LRUCache()
+
+
+def file_version(path: str) -> int:
+    return os.stat(path).st_mtime_ns
+
+
+def load_font(path: str, size: int) -> ImageFont.FreeTypeFont:
+    return CACHE.get(("font", path, file_version(path), size),
+                     lambda: ImageFont.truetype(path, size),
+                     lambda font: os.path.getsize(path))
+
+
+def load_character_sets(path: str) -> Tuple[str, ...]:
+    """Return the sets of a ``Set N: chars`` file, one string per set."""
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"File not found: {path}")
+
+    def parse():
+        with open(path, 'r', encoding='utf-8') as file:
+            lines = file.readlines()
+        return tuple(line.strip().split(': ')[1] for line in lines if line.startswith('Set'))
+
+    return CACHE.get(("charset", path, file_version(path)), parse,
+                     lambda sets: sum(len(chars.encode('utf-8')) for chars in sets))
+
+
+def load_glyph(font: ImageFont.FreeTypeFont, text: str, rasterize: Callable[[], Tuple[np.ndarray, ...]]) -> Tuple[np.ndarray, ...]:
+    return CACHE.get(("glyph", font.path, file_version(font.path), font.size, text), rasterize,
+                     lambda arrays: sum(array.nbytes for array in arrays))
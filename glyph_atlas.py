@@ -0,0 +1,263 @@
+"""
+Glyph atlas renderer shared by the ASCII art nodes.
+
+Every (font, text) pair is rasterized by FreeType once into a coverage mask.
+Whole grids of cells are then composited with NumPy: the masks are gathered
+by glyph index, blended with the per-cell color and written back onto the
+canvas. The blend uses the same integer arithmetic as ``ImageDraw.text``, so
+the result is identical to drawing the cells one by one with ``draw.text``.
+"""
+from functools import partial
+from typing import Optional, Tuple
+from PIL import Image, ImageDraw, ImageFont
+import numpy as np
+from .batching import WorkerPool, map_frames, resolve_workers
+from .cache import load_glyph
+from .glyph_store import GlyphStore, load_glyph_store
+
+# Ink pixels blended at once, at most, to bound the temporaries of large draw groups
+BLEND_PIXELS = 1 << 20
+
+
+class GlyphAtlas:
+    """Covered pixels of the texts drawn on a canvas, one entry per (font, text).
+
+    Fonts are identified by file and size, so separately loaded instances
+    of the same font share their glyphs. Rasterized glyphs are kept in the
+    shared cache, so new atlases only gather them. Glyphs requested with a
+    ``charset`` are also looked up in, and added to, the on-disk store of
+    that font, size and character set; ``save`` writes the stores.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._glyphs = []
+        self._stores = {}
+        self._ink = None
+
+    def __len__(self) -> int:
+        return len(self._glyphs)
+
+    def __getstate__(self):
+        # Stores hold a lock and are only written by the process that owns the atlas
+        return {**self.__dict__, "_stores": {}}
+
+    def glyph_id(self, font: ImageFont.FreeTypeFont, text: str, charset: Optional[str] = None) -> int:
+        key = (font.path, font.size, text)
+        glyph = self._ids.get(key)
+        if glyph is None:
+            glyph = len(self._glyphs)
+            if charset is not None:
+                store = load_glyph_store(font, charset)
+                self._stores[store.path] = store
+                self._glyphs.append(stored_glyph(font, text, store))
+            else:
+                self._glyphs.append(load_glyph(font, text, partial(self.rasterize, font, text)))
+            self._ids[key] = glyph
+            self._ink = None
+        return glyph
+
+    def save(self) -> None:
+        for store in self._stores.values():
+            store.flush()
+
+    @staticmethod
+    def rasterize(font: ImageFont.FreeTypeFont, text: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the ``dx``, ``dy`` and ``alpha`` of the pixels ``text`` covers.
+
+        Drawing with full ink on black leaves exactly the coverage mask that
+        draw.text blends with, positioned by the same bounding box. Offsets
+        are relative to the point passed to ``draw.text``; pixels with zero
+        coverage leave the canvas untouched when blended, so they are dropped.
+        """
+        left, top, right, bottom = font.getbbox(text)
+        mask = Image.new('L', (right - left, bottom - top), 0)
+        ImageDraw.Draw(mask).text((-left, -top), text, font=font, fill=255)
+        mask = np.array(mask)
+        ys, xs = np.nonzero(mask)
+        return xs + left, ys + top, mask[ys, xs]
+
+    def ink(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Return the covered pixels of all glyphs as flat arrays.
+
+        ``dx``, ``dy`` and ``alpha`` hold one entry per covered pixel, and
+        glyph ``i`` owns the entries ``start[i]:start[i] + count[i]``.
+        """
+        if self._ink is None:
+            count = np.array([len(dx) for dx, _, _ in self._glyphs], dtype=np.int64)
+            start = np.cumsum(count) - count
+            empty = np.zeros(0, dtype=np.int64)
+            dx, dy, alpha = zip(*self._glyphs) if self._glyphs else ((), (), ())
+            self._ink = (np.concatenate(dx + (empty,)), np.concatenate(dy + (empty,)),
+                         np.concatenate(alpha + (empty.astype(np.uint8),)).astype(np.uint16), start, count)
+        return self._ink
+
+
+def stored_glyph(font: ImageFont.FreeTypeFont, text: str, store: GlyphStore) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """The glyph of ``text`` from the shared cache, ``store`` or FreeType, recorded in ``store`` wherever it came from."""
+    glyph = load_glyph(font, text, partial(store.get, text, partial(GlyphAtlas.rasterize, font, text)))
+    store.record(text, glyph)
+    return glyph
+
+
+def cell_positions(cells: int, length: int) -> np.ndarray:
+    """Pixel offsets of ``cells`` grid cells spread over ``length`` pixels."""
+    return (np.arange(cells) * (length / cells)).astype(np.int64)
+
+
+def draw_groups(grid_x: np.ndarray, grid_y: np.ndarray, reach_x: int, reach_y: int, block: Optional[int] = None) -> np.ndarray:
+    """Assign every cell a draw group so that a whole group can be blended at once.
+
+    Cells are drawn in raster order of their grid coordinates, or block by
+    block when ``block`` is given. Cells more than ``reach_x`` columns or
+    ``reach_y`` rows apart never overlap, so only nearer cells constrain the
+    order. The returned group index is linear in the grid coordinates and
+    strictly increases from each cell to every later cell it may overlap,
+    so cells in one group never overlap and groups are composited in order.
+    """
+    step_x = 1 if reach_x > 0 else 0
+    step_y = step_x * reach_x + 1 if reach_y > 0 else 0
+    groups = step_y * grid_y + step_x * grid_x
+    if block is not None and step_y > 0:
+        # A later block in the same block row may start above the previous
+        # one's last row, and a later block row may start left of it.
+        step_bx = max(step_y * reach_y - step_x + 1, 0)
+        step_by = step_bx * -(-reach_x // block)
+        groups = groups + step_bx * (grid_x // block) + step_by * (grid_y // block)
+    return groups
+
+
+def render_glyphs(atlas: GlyphAtlas, size: Tuple[int, int], pos_x: np.ndarray, pos_y: np.ndarray,
+                  glyph_ids: np.ndarray, colors: np.ndarray, grid_x: np.ndarray, grid_y: np.ndarray,
+                  pitch: Tuple[float, float], block: Optional[int] = None,
+                  background: Tuple[int, int, int] = (255, 255, 255),
+                  canvas: Optional[np.ndarray] = None, changed: Optional[np.ndarray] = None) -> np.ndarray:
+    """Composite one atlas glyph per cell onto a new canvas.
+
+    ``pos_x``/``pos_y`` are the pixel positions handed to ``draw.text``,
+    ``grid_x``/``grid_y`` the cell coordinates that define the draw order and
+    ``pitch`` the (x, y) cell spacing in pixels. Returns an (H, W, 3) uint8
+    array for a canvas of ``size`` (width, height); it may be a view into a
+    slightly larger padded buffer.
+
+    To update an earlier render of the same cells, pass it as ``canvas`` and
+    flag the cells whose glyph or color differ in ``changed``. Only the
+    pixels those cells can reach are cleared and redrawn, from every cell
+    that covers them, so the result equals a full render.
+    """
+    width, height = size
+    ink_dx, ink_dy, ink_alpha, ink_start, ink_count = atlas.ink()
+    if len(ink_dx) == 0 or len(glyph_ids) == 0:
+        blank = np.empty((height, width, 3), dtype=np.uint8)
+        blank[...] = background
+        return blank
+
+    # Pad the canvas so every glyph fits; clipped pixels are cropped at the end.
+    x0, x1 = int(ink_dx.min()), int(ink_dx.max()) + 1
+    y0, y1 = int(ink_dy.min()), int(ink_dy.max()) + 1
+    pad_l, pad_t = max(0, -x0), max(0, -y0)
+    stride = width + pad_l + max(0, x1)
+    padded = np.empty((height + pad_t + max(0, y1), stride, 3), dtype=np.uint8)
+    padded[...] = background
+    pixels = padded.reshape(-1, 3)
+
+    # Positions are truncated products, so neighbours can be one pixel closer than the pitch.
+    reach_x = max(int(np.ceil((x1 - x0 + 2) / pitch[0])) - 1, 0)
+    reach_y = max(int(np.ceil((y1 - y0 + 2) / pitch[1])) - 1, 0)
+    groups = draw_groups(grid_x, grid_y, reach_x, reach_y, block)
+
+    region = None
+    if canvas is not None and changed is not None:
+        padded[pad_t:pad_t + height, pad_l:pad_l + width] = canvas
+        # Every cell covers at most the rectangle spanned by the atlas ink
+        top, left = pos_y + pad_t + y0, pos_x + pad_l + x0
+        bottom, right = top + (y1 - y0), left + (x1 - x0)
+        region = _cover(padded.shape[:2], top[changed], left[changed], bottom[changed], right[changed])
+        table = np.pad(region, ((1, 0), (1, 0))).cumsum(axis=0, dtype=np.int32).cumsum(axis=1, dtype=np.int32)
+        touched = (table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]) > 0
+        padded[region] = background
+        region = region.reshape(-1, 1).astype(np.uint16)
+    else:
+        touched = np.ones(len(glyph_ids), dtype=bool)
+
+    cells = np.flatnonzero(touched)
+    order = cells[np.argsort(groups[cells], kind='stable')]
+    bounds = np.flatnonzero(np.diff(groups[order])) + 1
+
+    ink_offset = ink_dy * stride + ink_dx
+    origin = (pos_y + pad_t) * stride + pos_x + pad_l
+    for group in np.split(order, bounds):
+        # Cells of a group never overlap, so a large group is blended in parts to bound the temporaries
+        parts = -(-int(ink_count[glyph_ids[group]].sum()) // BLEND_PIXELS)
+        for cells in np.array_split(group, max(parts, 1)):
+            glyphs = glyph_ids[cells]
+            counts = ink_count[glyphs]
+            # Index of every covered pixel of every cell in the flat ink arrays
+            first = np.cumsum(counts) - counts
+            src = np.arange(counts.sum()) + np.repeat(ink_start[glyphs] - first, counts)
+            dst = np.repeat(origin[cells], counts) + ink_offset[src]
+            alpha = ink_alpha[src][:, None]
+            if region is not None:
+                alpha = alpha * region[dst]
+            ink = np.repeat(colors[cells].astype(np.uint16), counts, axis=0)
+            # BLEND/DIV255 from libImaging: round(dst * (255 - a) + ink * a) / 255
+            blended = pixels[dst] * (255 - alpha) + ink * alpha + 128
+            pixels[dst] = ((blended >> 8) + blended) >> 8
+
+    return padded[pad_t:pad_t + height, pad_l:pad_l + width]
+
+
+def render_tiled(atlas: GlyphAtlas, size: Tuple[int, int], pos_x: np.ndarray, pos_y: np.ndarray,
+                 glyph_ids: np.ndarray, colors: np.ndarray, grid_x: np.ndarray, grid_y: np.ndarray,
+                 pitch: Tuple[float, float], block: Optional[int] = None,
+                 background: Tuple[int, int, int] = (255, 255, 255), workers: int = 1, pool: str = "thread",
+                 worker_pool: Optional[WorkerPool] = None) -> np.ndarray:
+    """Render like ``render_glyphs``, split into horizontal tiles rendered by up to ``workers`` workers.
+
+    Each tile is drawn on a canvas extended by the rows that glyphs of
+    neighbouring tiles can spill into, from every cell whose glyph can
+    reach the tile, and the extension is cropped off again. The draw order
+    follows the grid coordinates, so the stitched result is identical to a
+    single render.
+    """
+    width, height = size
+    ink_dy = atlas.ink()[1]
+    if len(ink_dy) == 0:
+        return render_glyphs(atlas, size, pos_x, pos_y, glyph_ids, colors, grid_x, grid_y, pitch, block, background)
+
+    # Tiles are kept at least twice the glyph height so the margins stay small
+    y0, y1 = int(ink_dy.min()), int(ink_dy.max()) + 1
+    tiles = resolve_workers(workers, max(1, height // (2 * (y1 - y0))))
+    if tiles == 1:
+        return render_glyphs(atlas, size, pos_x, pos_y, glyph_ids, colors, grid_x, grid_y, pitch, block, background)
+
+    jobs = []
+    bounds = np.linspace(0, height, tiles + 1).astype(np.int64).tolist()
+    for top, bottom in zip(bounds[:-1], bounds[1:]):
+        # Cells drawn from rows first..last-1 are the ones whose glyphs can reach the tile
+        first, last = top - y1 + 1, bottom - y0
+        canvas_top, canvas_bottom = max(min(first, top), 0), min(max(last, bottom), height)
+        cells = np.flatnonzero((pos_y >= first) & (pos_y < last))
+        jobs.append((atlas, (width, canvas_bottom - canvas_top), pos_x[cells], pos_y[cells] - canvas_top, glyph_ids[cells],
+                     colors[cells], grid_x[cells], grid_y[cells], pitch, block, background, top - canvas_top, bottom - canvas_top))
+
+    ascii_image = np.empty((height, width, 3), dtype=np.uint8)
+    rendered = worker_pool.map(_render_tile, jobs, tiles) if worker_pool is not None else map_frames(_render_tile, jobs, tiles, pool)
+    for (top, bottom), tile in zip(zip(bounds[:-1], bounds[1:]), rendered):
+        ascii_image[top:bottom] = tile
+    return ascii_image
+
+
+def _render_tile(job: tuple) -> np.ndarray:
+    *args, top, bottom = job
+    return render_glyphs(*args)[top:bottom]
+
+
+def _cover(shape: Tuple[int, int], top: np.ndarray, left: np.ndarray, bottom: np.ndarray, right: np.ndarray) -> np.ndarray:
+    # Union of [top, bottom) x [left, right) rectangles via a 2D difference array
+    edges = np.zeros((shape[0] + 1, shape[1] + 1), dtype=np.int32)
+    np.add.at(edges, (top, left), 1)
+    np.add.at(edges, (top, right), -1)
+    np.add.at(edges, (bottom, left), -1)
+    np.add.at(edges, (bottom, right), 1)
+    return edges.cumsum(axis=0, dtype=np.int32).cumsum(axis=1, dtype=np.int32)[:-1, :-1] > 0
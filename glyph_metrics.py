@@ -0,0 +1,77 @@
+"""
+Ink coverage of glyphs, for choosing characters by how they look.
+
+A character set is ordered by the author's idea of density, which rarely
+matches the ink its glyphs actually cover in a given font. For one font
+and size the glyphs of a set are measured once, over the box around the
+ink of the whole set: their mean coverage and a small shape descriptor,
+the coverage of each of DESCRIPTOR_SIZE x DESCRIPTOR_SIZE sub-blocks of
+the box. The coverage is rescaled so the sparsest glyph of the set is 0
+and the densest 1, which makes it comparable with a brightness in 0..1;
+each descriptor keeps that mean and its variation around it, scaled so
+the most covered sub-block of the set is 1.
+Characters are then chosen for a whole grid at once, with a 256-entry
+brightness lookup table or a batched nearest-descriptor search.
+"""
+from typing import Tuple
+import numpy as np
+from PIL import ImageFont
+from .cache import CACHE, file_version
+from .glyph_atlas import stored_glyph
+from .glyph_store import load_glyph_store
+
+DESCRIPTOR_SIZE = 3
+# Cells compared against all descriptors at once in nearest_glyphs
+CHUNK_CELLS = 1 << 16
+
+
+def measure_glyphs(font: ImageFont.FreeTypeFont, charset: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the rescaled coverage [n] and shape descriptors [n, s*s] of every character of ``charset``."""
+    def measure():
+        size = DESCRIPTOR_SIZE
+        # Through the store of the set, so the glyphs drawn later are on disk for the next process
+        store = load_glyph_store(font, charset)
+        inks = [stored_glyph(font, char, store) for char in charset]
+        store.flush()
+        dx, dy, alpha = (np.concatenate(axis) for axis in zip(*inks))
+        owner = np.repeat(np.arange(len(charset)), [len(ink[2]) for ink in inks])
+
+        # All glyphs are binned over the same box, the one around the ink of the whole set
+        if len(alpha):
+            left, top = dx.min(), dy.min()
+            box_width, box_height = dx.max() - left + 1, dy.max() - top + 1
+        else:
+            left = top = 0
+            box_width = box_height = 1
+        bins = ((dy - top) * size // box_height) * size + (dx - left) * size // box_width
+        descriptors = np.bincount(owner * size * size + bins, weights=alpha, minlength=len(charset) * size * size)
+        descriptors = descriptors.reshape(len(charset), size * size) / (255 * box_width * box_height / (size * size))
+
+        coverage = descriptors.mean(axis=1)
+        low, span = coverage.min(), np.ptp(coverage)
+        if span == 0:
+            return np.zeros_like(coverage), np.zeros_like(descriptors)
+        # The mean is stretched like the coverage, the variation around it only scaled into 0..1
+        rescaled = (coverage - low) / span
+        return rescaled, rescaled[:, None] + (descriptors - coverage[:, None]) / descriptors.max()
+
+    return CACHE.get(("metrics", font.path, file_version(font.path), font.size, charset, DESCRIPTOR_SIZE), measure,
+                     lambda metrics: sum(array.nbytes for array in metrics))
+
+
+def density_lut(coverage: np.ndarray) -> np.ndarray:
+    """For every brightness level 0..255, the glyph whose coverage is closest to level / 255."""
+    levels = np.arange(256) / 255.0
+    return np.abs(levels[:, None] - coverage[None, :]).argmin(axis=1)
+
+
+def nearest_glyphs(targets: np.ndarray, descriptors: np.ndarray) -> np.ndarray:
+    """Index of the descriptor nearest to each row of ``targets`` [N, s*s], by squared distance."""
+    descriptors = descriptors.astype(np.float32)
+    norms = (descriptors ** 2).sum(axis=1)
+    result = np.empty(len(targets), dtype=np.int64)
+    for start in range(0, len(targets), CHUNK_CELLS):
+        chunk = targets[start:start + CHUNK_CELLS].astype(np.float32)
+        # |t - d|^2 = |t|^2 - 2 t.d + |d|^2, and |t|^2 is the same for every d
+        result[start:start + CHUNK_CELLS] = (norms[None, :] - 2 * chunk @ descriptors.T).argmin(axis=1)
+    return result
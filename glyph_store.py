@@ -0,0 +1,198 @@
+"""
+Persistent on-disk store of rasterized glyphs.
+
+Rasterizing a character set with FreeType is the main cost of the first
+render after a restart. Each (font file, size, character set) gets a file
+in ``glyph_cache/`` next to the ``font`` folder, or in the directory named
+by the ASCII_ART_GLYPH_CACHE environment variable, that records the glyphs
+drawn with it. Later processes map the file read-only with np.memmap and
+hand out views into it, so cached glyphs are neither rasterized nor copied
+again.
+
+A file holds a fixed magic, the format version and a JSON header with the
+font hash, size, character set, texts, per-glyph pixel counts and a CRC-32
+of the data, followed by the ``dx``, ``dy`` (int32) and ``alpha`` (uint8)
+arrays of all glyphs. Files that are corrupt, truncated, of another version
+or made for other inputs are ignored and rewritten, as are files whose
+offsets fall outside the bounding box of their glyph, which would otherwise
+make the renderer pad its canvas to fit them. Writes go to a temporary
+file that replaces the old one, so readers never see a partial file.
+
+After a write, the stores of earlier versions of the same font file are
+deleted, and then the least recently used stores until the directory holds
+at most MAX_STORE_BYTES.
+"""
+import hashlib
+import json
+import logging
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from typing import Callable, Dict, Optional, Tuple
+from PIL import ImageFont
+import numpy as np
+from .cache import CACHE, file_version
+
+logger = logging.getLogger(__name__)
+
+STORE_DIR_ENV = "ASCII_ART_GLYPH_CACHE"
+STORE_DIR = os.environ.get(STORE_DIR_ENV) or os.path.join(os.path.dirname(os.path.realpath(__file__)), "glyph_cache")
+MAX_STORE_BYTES = 64 << 20
+MAGIC = b"ASCIIGLYPHS\0"
+VERSION = 2
+# Magic, format version and JSON header length
+PREFIX = struct.Struct("<12sIQ")
+
+Glyph = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def font_digest(path: str) -> str:
+    def digest():
+        with open(path, 'rb') as file:
+            return hashlib.sha256(file.read()).hexdigest()
+
+    return CACHE.get(("digest", path, file_version(path)), digest, lambda value: len(value))
+
+
+class GlyphStore:
+    """The stored glyphs of one font file, size and character set."""
+
+    def __init__(self, font: ImageFont.FreeTypeFont, charset: str, directory: Optional[str] = None):
+        self.font = font
+        self.header = {"font": font_digest(font.path), "size": font.size, "charset": charset}
+        self.directory = directory or STORE_DIR
+        # Files are named by font path, font contents, size and character set
+        path_digest = hashlib.sha256(os.path.realpath(font.path).encode('utf-8')).hexdigest()
+        charset_digest = hashlib.sha256(charset.encode('utf-8')).hexdigest()
+        self.font_prefix = f"{path_digest[:8]}-"
+        self.version_prefix = f"{self.font_prefix}{self.header['font'][:16]}-"
+        self.path = os.path.join(self.directory, f"{self.version_prefix}{font.size}-{charset_digest[:16]}.glyphs")
+        self._glyphs = self._read()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._glyphs) + len(self._pending)
+
+    def get(self, text: str, rasterize: Callable[[], Glyph]) -> Glyph:
+        """Return the stored glyph of ``text``, rasterizing and recording it if missing."""
+        glyph = self._glyphs.get(text)
+        if glyph is None:
+            with self._lock:
+                glyph = self._pending.get(text)
+                if glyph is None:
+                    glyph = self._pending[text] = rasterize()
+        return glyph
+
+    def record(self, text: str, glyph: Glyph) -> None:
+        """Add a glyph obtained elsewhere, such as from the shared cache, if the store lacks it."""
+        if text not in self._glyphs:
+            with self._lock:
+                self._pending.setdefault(text, glyph)
+
+    def flush(self) -> None:
+        """Write the store if glyphs were added since it was read or written."""
+        with self._lock:
+            if not self._pending:
+                return
+            glyphs = {**self._glyphs, **self._pending}
+            try:
+                self._write(glyphs)
+                self._prune()
+            except OSError as e:
+                logger.warning("Could not write glyph cache %s: %s", self.path, e)
+            self._glyphs = glyphs
+            self._pending = {}
+
+    def _read(self) -> Dict[str, Glyph]:
+        try:
+            with open(self.path, 'rb') as file:
+                magic, version, header_size = PREFIX.unpack(file.read(PREFIX.size))
+                if magic != MAGIC or version != VERSION:
+                    raise ValueError(f"unsupported format {magic!r} version {version}")
+                header = json.loads(file.read(header_size).decode('utf-8'))
+            if any(header.get(key) != value for key, value in self.header.items()):
+                raise ValueError("made for another font, size or character set")
+
+            counts = np.array(header["counts"], dtype=np.int64)
+            total = int(counts.sum())
+            offset = PREFIX.size + header_size
+            if len(counts) != len(header["texts"]) or os.path.getsize(self.path) != offset + total * 9:
+                raise ValueError("truncated or inconsistent data")
+            if total == 0:
+                return dict.fromkeys(header["texts"], (np.zeros(0, np.int32), np.zeros(0, np.int32), np.zeros(0, np.uint8)))
+
+            data = np.memmap(self.path, dtype=np.uint8, mode='r', offset=offset)
+            dx = data[:total * 4].view(np.int32)
+            dy = data[total * 4:total * 8].view(np.int32)
+            alpha = data[total * 8:]
+            if zlib.crc32(data) != header["crc32"]:
+                raise ValueError("checksum mismatch")
+            # Offsets lie in the box font.getbbox gives the text, as rasterize produces them
+            bounds = np.array([self.font.getbbox(text) for text in header["texts"]], dtype=np.int64).reshape(-1, 4)
+            boxes = np.repeat(bounds, counts, axis=0)
+            if ((dx < boxes[:, 0]) | (dx >= boxes[:, 2]) | (dy < boxes[:, 1]) | (dy >= boxes[:, 3])).any():
+                raise ValueError("glyph offsets outside their bounding boxes")
+            try:
+                # The modification time orders the stores for pruning
+                os.utime(self.path)
+            except OSError:
+                pass
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError, TypeError, struct.error) as e:
+            logger.warning("Rebuilding glyph cache %s: %s", self.path, e)
+            return {}
+
+        ends = np.cumsum(counts).tolist()
+        starts = [0] + ends[:-1]
+        return {text: (dx[start:end], dy[start:end], alpha[start:end])
+                for text, start, end in zip(header["texts"], starts, ends)}
+
+    def _write(self, glyphs: Dict[str, Glyph]) -> None:
+        texts = list(glyphs)
+        data = [np.ascontiguousarray(glyphs[text][field], dtype=dtype).tobytes()
+                for field, dtype in ((0, np.int32), (1, np.int32), (2, np.uint8)) for text in texts]
+        crc = 0
+        for chunk in data:
+            crc = zlib.crc32(chunk, crc)
+        header = json.dumps({**self.header, "texts": texts, "counts": [len(glyphs[text][0]) for text in texts], "crc32": crc},
+                            ensure_ascii=False).encode('utf-8')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(self.path))
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(PREFIX.pack(MAGIC, VERSION, len(header)))
+                file.write(header)
+                file.writelines(data)
+            # mkstemp creates the file private to its owner; other workers need to read it
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _prune(self) -> None:
+        stores = [entry for entry in os.scandir(self.directory)
+                  if entry.name.endswith(".glyphs") and entry.path != self.path and entry.is_file()]
+        stale = [entry for entry in stores if entry.name.startswith(self.font_prefix) and not entry.name.startswith(self.version_prefix)]
+        stores = sorted((entry for entry in stores if entry not in stale), key=lambda entry: entry.stat().st_mtime_ns)
+        total = os.path.getsize(self.path) + sum(entry.stat().st_size for entry in stores)
+        while stores and total > MAX_STORE_BYTES:
+            entry = stores.pop(0)
+            total -= entry.stat().st_size
+            stale.append(entry)
+        for entry in stale:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                # Another process may have removed it, or still map it where that prevents removal
+                pass
+
+
+def load_glyph_store(font: ImageFont.FreeTypeFont, charset: str) -> GlyphStore:
+    return CACHE.get(("store", font.path, file_version(font.path), font.size, charset),
+                     lambda: GlyphStore(font, charset),
+                     lambda store: len(charset.encode('utf-8')))
@@ -0,0 +1,64 @@
+"""
+Choices offered by the node inputs, importable without the rendering stack.
+
+ComfyUI imports every custom node package at startup and calls INPUT_TYPES
+whenever the UI asks for node definitions. The node modules only need the
+names below for that, so they import this module and load the engine (and
+with it torch, NumPy and PIL) on their first execution. The lists are
+the values accepted by the strategy registries of ascii_engine, the worker
+pools of batching, the sampling of preprocess and text_export, which
+import them from here and reject anything else. The optional inputs shared by
+several nodes are defined here once and merged into their INPUT_TYPES.
+
+``font_list`` is ``get_filename_list("font")`` cached until the
+modification time of one of the font directories changes.
+"""
+import os
+from typing import List
+from folder_paths import folder_names_and_paths, get_filename_list
+
+POOL_TYPES = ["thread", "process"]
+
+CHAR_MAPPING_NAMES = ["rgb_triple", "brightness", "density", "shape"]
+# Mappings that draw one character per cell, which the brightness nodes can switch between
+SINGLE_CHAR_MAPPINGS = ["brightness", "density", "shape"]
+SIZE_SELECTION_NAMES = ["random", "brightness_threshold", "fixed", "adaptive"]
+SAMPLINGS = ["corner", "center"]
+
+TEXT_FORMATS = {"plain": "txt", "ansi": "ans", "html": "html"}
+
+# Optional inputs of the nodes that render frames
+RENDER_INPUTS = {
+    "workers": ("INT", {"default": 1, "min": 0, "max": 64, "tooltip": "Frames, or tiles of a single image, rendered in parallel (0 = one per CPU core)"}),
+    "pool": (POOL_TYPES, {"default": "thread"}),
+    "incremental": ("BOOLEAN", {"default": False, "tooltip": "Redraw only the cells that changed since the previous frame"}),
+    "change_tolerance": ("INT", {"default": 0, "min": 0, "max": 255, "tooltip": "Largest color change per channel for a cell to count as unchanged"}),
+}
+# Optional inputs of the nodes that draw one character per cell
+CHARACTER_INPUTS = {
+    "char_mapping": (SINGLE_CHAR_MAPPINGS, {"default": "brightness", "tooltip": "Pick characters by their place in the set, or by the ink their glyphs cover in the font (density) or in each part of the cell (shape)"}),
+    "adaptive_grid": ("BOOLEAN", {"default": False, "tooltip": "Merge flat 2x2 and 4x4 blocks of cells into one cell with a 2x or 4x glyph"}),
+    "detail_threshold": ("FLOAT", {"default": 8.0, "min": 0.0, "max": 128.0, "tooltip": "With the adaptive grid, blocks whose luma varies less than this (standard deviation, 0-255) are merged"}),
+}
+PROFILE_INPUTS = {
+    "profile": ("BOOLEAN", {"default": False, "tooltip": "Log stage timings, cell counts and cache hit rates of this run (also enabled by ASCII_ART_PROFILE)"}),
+}
+
+_font_list = (None, [])
+
+
+def directory_version(path: str):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def font_list() -> List[str]:
+    global _font_list
+    paths = folder_names_and_paths.get("font", ([], set()))[0]
+    # Adding or removing a font changes the modification time of its directory
+    key = tuple((path, directory_version(path)) for path in paths)
+    if _font_list[0] != key:
+        _font_list = (key, get_filename_list("font"))
+    return _font_list[1]
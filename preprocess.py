@@ -0,0 +1,161 @@
+"""
+Tensor preprocessing shared by the ASCII art nodes.
+
+Brightness, contrast and the downsampling to one color per grid cell are
+done on the device of the input batch, without converting frames to PIL.
+Both enhancements are per-pixel maps, so only the sampled pixels are
+enhanced; the full frames are read once for the mean luminance that the
+contrast adjustment needs, a few rows at a time so that no full-resolution
+temporary is made. The arithmetic follows ImageEnhance and
+Image.resize(NEAREST) exactly, so the grids match the PIL pipeline.
+"""
+from typing import Optional, Tuple
+from PIL import Image
+import numpy as np
+import torch
+import torch.nn.functional as F
+from .options import SAMPLINGS
+
+# Frames are processed in chunks of about this many pixels to bound memory
+CHUNK_PIXELS = 1 << 24
+# Full-resolution temporaries are made for about this many pixels at a time
+CONVERT_PIXELS = 1 << 20
+
+
+def to_image_tensor(image) -> torch.Tensor:
+    """Return an IMAGE input as a [B,H,W,3] tensor, float in 0..1 or uint8."""
+    if isinstance(image, Image.Image):
+        image = np.array(image.convert('RGB'))
+    if isinstance(image, np.ndarray):
+        image = torch.from_numpy(np.ascontiguousarray(image))
+    if not isinstance(image, torch.Tensor):
+        raise ValueError(f"Unsupported image type: Expected a torch.Tensor, PIL.Image, or NumPy array, but got {type(image)}")
+    if image.dim() == 3:
+        image = image.unsqueeze(0)
+    return image[..., :3]
+
+
+def to_uint8(image: torch.Tensor) -> torch.Tensor:
+    # Float frames are scaled and truncated like (image * 255).astype(np.uint8),
+    # a few rows at a time so the float32 temporary stays small
+    if image.dtype == torch.uint8:
+        return image
+    out = torch.empty(image.shape, dtype=torch.uint8, device=image.device)
+    step = max(1, CONVERT_PIXELS // max(1, image[..., 0].numel() // max(1, image.shape[-3])))
+    for rows, out_rows in zip(image.split(step, dim=-3), out.split(step, dim=-3)):
+        scaled = rows.mul(255) if rows.dtype == torch.float32 else rows.to(torch.float32).mul_(255)
+        out_rows.copy_(scaled.clamp_(0, 255))
+    return out
+
+
+def luma_levels(frames: torch.Tensor, luma_luts) -> torch.Tensor:
+    """ITU-R 601-2 luma of uint8 frames through per-channel 16.16 fixed point tables, as Image.convert('L') computes it."""
+    luma = luma_luts[0][frames[..., 0].to(torch.int32)]
+    for c in (1, 2):
+        luma += luma_luts[c][frames[..., c].to(torch.int32)]
+    luma += 0x8000
+    luma >>= 16
+    return luma
+
+
+def grid_size(height: int, width: int, pixel_size: int, aspect_ratio_correction: float) -> Tuple[int, int]:
+    rows = int(height // (pixel_size * aspect_ratio_correction))
+    cols = width // pixel_size
+    if rows < 1 or cols < 1:
+        raise ValueError(f"pixel_size {pixel_size} is too large for a {width}x{height} image")
+    return rows, cols
+
+
+def sample_indices(length: int, cells: int, sampling: str) -> torch.Tensor:
+    """Source pixel of each of ``cells`` nearest-neighbour samples along one axis.
+
+    ``center`` matches Image.resize(NEAREST), which samples the middle of
+    each cell and accumulates the step in double precision like libImaging.
+    ``corner`` matches F.interpolate(mode='nearest'), which takes the first
+    pixel of each cell; its own index math is reused on an index ramp.
+    """
+    if sampling not in SAMPLINGS:
+        raise ValueError(f"Unknown sampling: {sampling}. Expected one of {', '.join(SAMPLINGS)}")
+    if sampling == "center":
+        step = length / cells
+        positions = np.cumsum(np.concatenate(([step * 0.5], np.full(cells - 1, step))))
+        return torch.from_numpy(np.minimum(positions.astype(np.int64), length - 1))
+    ramp = torch.arange(length, dtype=torch.float64).view(1, 1, -1)
+    return F.interpolate(ramp, size=cells, mode='nearest').view(-1).long()
+
+
+def blend(degenerate: torch.Tensor, image: torch.Tensor, factor: float) -> torch.Tensor:
+    """Image.blend(degenerate, image, factor) on uint8 values, as libImaging computes it."""
+    alpha = torch.tensor(factor, dtype=torch.float32, device=image.device)
+    degenerate = degenerate.to(torch.int32)
+    out = (image.to(torch.int32) - degenerate).to(torch.float32) * alpha + degenerate
+    return out.clamp(0, 255).to(torch.uint8)
+
+
+def pixelate(image: torch.Tensor, pixel_size: int, aspect_ratio_correction: float, brightness: float, contrast: float, sampling: str = "corner") -> np.ndarray:
+    """Enhance and downsample a [B,H,W,3] batch to one color per grid cell.
+
+    Gives the same result as ImageEnhance.Brightness, ImageEnhance.Contrast
+    and a nearest-neighbour resize applied to every frame. Returns a uint8
+    [B, rows, cols, 3] array.
+    """
+    batch, height, width = image.shape[:3]
+    rows, cols = grid_size(height, width, pixel_size, aspect_ratio_correction)
+    device = image.device
+    ys = sample_indices(height, rows, sampling).to(device)
+    xs = sample_indices(width, cols, sampling).to(device)
+
+    levels = torch.arange(256, device=device)
+    brightness_lut = blend(torch.zeros_like(levels), levels, brightness)
+    # ITU-R 601-2 luma in 16.16 fixed point, as Image.convert('L') computes it
+    luma_luts = [brightness_lut.to(torch.int32) * weight for weight in (19595, 38470, 7471)]
+
+    grids = []
+    for chunk in image.split(max(1, CHUNK_PIXELS // (height * width))):
+        luma_sums = torch.zeros(len(chunk), dtype=torch.int64, device=device)
+        for pixel_rows in chunk.split(max(1, CONVERT_PIXELS // (len(chunk) * width)), dim=1):
+            luma_sums += luma_levels(to_uint8(pixel_rows), luma_luts).sum(dim=(1, 2))
+        # ImageStat mean, rounded to the gray level Contrast blends against
+        means = torch.tensor([int(total / (height * width) + 0.5) for total in luma_sums.tolist()], device=device)
+
+        small = brightness_lut[to_uint8(chunk[:, ys][:, :, xs]).to(torch.int32)]
+        grids.append(blend(means.view(-1, 1, 1, 1), small, contrast).cpu().numpy())
+    return np.concatenate(grids)
+
+
+def cell_detail(image: torch.Tensor, rows: int, cols: int, brightness: float, contrast: float, size: int) -> np.ndarray:
+    """Mean enhanced luma of ``size`` x ``size`` sub-blocks of every grid cell.
+
+    The cells span the whole frame, as they are drawn. Contrast is applied to
+    the luma rather than to each channel, which is the same up to clamping.
+    Returns a float32 [B, rows, cols, size * size] array in 0..1.
+    """
+    batch, height, width = image.shape[:3]
+    device = image.device
+    levels = torch.arange(256, device=device)
+    brightness_lut = blend(torch.zeros_like(levels), levels, brightness)
+    luma_luts = [brightness_lut.to(torch.int32) * weight for weight in (19595, 38470, 7471)]
+
+    details = []
+    for chunk in image.split(max(1, CHUNK_PIXELS // (height * width))):
+        luma = torch.empty(chunk.shape[:3], dtype=torch.float32, device=device)
+        step = max(1, CONVERT_PIXELS // (len(chunk) * width))
+        for pixel_rows, luma_rows in zip(chunk.split(step, dim=1), luma.split(step, dim=1)):
+            luma_rows.copy_(luma_levels(to_uint8(pixel_rows), luma_luts))
+        means = luma.mean(dim=(1, 2), keepdim=True).add(0.5).floor()
+        luma.sub_(means).mul_(contrast).add_(means).clamp_(0, 255)
+        blocks = F.interpolate(luma.unsqueeze(1), size=(rows * size, cols * size), mode='area').view(-1, rows, size, cols, size)
+        details.append((blocks.permute(0, 1, 3, 2, 4).reshape(-1, rows, cols, size * size) / 255).cpu().numpy())
+    return np.concatenate(details)
+
+
+def resize_masks(mask, height: int, width: int) -> Optional[np.ndarray]:
+    """Return a MASK input as uint8 [M,H,W] frames at the image size."""
+    if mask is None:
+        return None
+    if not isinstance(mask, torch.Tensor):
+        mask = torch.from_numpy(np.asarray(mask, dtype=np.float32))
+    mask = mask.reshape(-1, *mask.shape[-2:]).to(torch.float32)
+    if tuple(mask.shape[-2:]) != (height, width):
+        mask = F.interpolate(mask.unsqueeze(1), size=(height, width), mode='bicubic', antialias=True).squeeze(1)
+    return (mask * 255).clamp(0, 255).to(torch.uint8).cpu().numpy()
@@ -0,0 +1,158 @@
+"""
+Lightweight stage timing for the ASCII art nodes.
+
+The nodes wrap their stages in ``stage(name)``: ``load`` (character sets),
+``tensor`` (input and output tensor conversion), ``preprocess``
+(enhancement, downsampling and mask resizing), ``glyphs`` (fonts, the
+glyph atlas and the glyph store), ``render`` (drawing) and ``composite``
+(blending and writing the output batch). While a StageTimer is active the
+wall time of every stage is added to it, less the time of the stages
+nested in it on the same thread, so the stages add up to the run;
+otherwise ``stage`` does nothing but check for one. ``count`` works the
+same way for quantities such as cell counts and allocation sizes.
+
+``profile_run`` turns this into opt-in instrumentation of one node run. It
+is enabled by the node's ``profile`` input or by setting the
+ASCII_ART_PROFILE environment variable, and logs the stage timings,
+counts and glyph cache hit rates of the run. If ASCII_ART_PROFILE_FILE
+names a file, the same record is appended to it as one JSON line, so runs
+can be aggregated later. Work done in a process pool is not measured.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional, TypeVar
+from .cache import CACHE
+
+STAGES = ("load", "tensor", "preprocess", "glyphs", "render", "composite")
+
+PROFILE_ENV = "ASCII_ART_PROFILE"
+PROFILE_FILE_ENV = "ASCII_ART_PROFILE_FILE"
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_active = []
+_lock = threading.Lock()
+# Per thread, the time spent in the stages nested in each open stage
+_nested = threading.local()
+
+
+class StageTimer:
+    """Accumulates the wall time of the stages run while it is active."""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counts = defaultdict(int)
+
+    def __enter__(self) -> "StageTimer":
+        with _lock:
+            _active.append(self)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        with _lock:
+            _active.remove(self)
+
+    def add(self, name: str, seconds: float) -> None:
+        with _lock:
+            self.seconds[name] += seconds
+            self.calls[name] += 1
+
+    def add_count(self, name: str, value: int) -> None:
+        with _lock:
+            self.counts[name] += value
+
+    @property
+    def total(self) -> float:
+        return sum(self.seconds.values())
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: self.seconds.get(name, 0.0) for name in (*STAGES, *sorted(set(self.seconds) - set(STAGES)))}
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    if not _active:
+        yield
+        return
+    open_stages = _nested.__dict__.setdefault("stack", [])
+    open_stages.append(0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        inner = open_stages.pop()
+        if open_stages:
+            open_stages[-1] += elapsed
+        for timer in list(_active):
+            timer.add(name, elapsed - inner)
+
+
+def count(name: str, value: int) -> None:
+    """Add ``value`` to the count ``name`` of every active timer."""
+    for timer in list(_active):
+        timer.add_count(name, int(value))
+
+
+def timed(name: str, iterable: Iterable[T]) -> Iterator[T]:
+    """Yield from ``iterable``, timing the production of every item as stage ``name``."""
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def profiling_enabled(profile: bool = False) -> bool:
+    return profile or os.environ.get(PROFILE_ENV, "").strip().lower() not in ("", "0", "false", "no", "off")
+
+
+@contextmanager
+def profile_run(name: str, profile: bool = False) -> Iterator[Optional[StageTimer]]:
+    """Instrument the node run in the block, if profiling is enabled, and report it when the block ends."""
+    if not profiling_enabled(profile):
+        yield None
+        return
+    hits, misses = CACHE.hits.copy(), CACHE.misses.copy()
+    start = time.perf_counter()
+    with StageTimer() as timer:
+        yield timer
+    report(name, timer, time.perf_counter() - start, CACHE.hits - hits, CACHE.misses - misses)
+
+
+def report(name: str, timer: StageTimer, seconds: float, hits, misses) -> Dict[str, Any]:
+    record = {
+        "node": name,
+        "time": time.time(),
+        "seconds": seconds,
+        "stages": timer.as_dict(),
+        "calls": dict(timer.calls),
+        "counts": dict(timer.counts),
+        "cache": {kind: {"hits": hits[kind], "misses": misses[kind], "hit_rate": hits[kind] / (hits[kind] + misses[kind])}
+                  for kind in sorted(set(hits) | set(misses))},
+        "cache_bytes": CACHE.nbytes,
+    }
+    stages = ", ".join(f"{stage_name} {value:.3f}s" for stage_name, value in record["stages"].items() if value)
+    counts = ", ".join(f"{count_name} {value}" for count_name, value in sorted(record["counts"].items()))
+    rates = ", ".join(f"{kind} {rate['hit_rate']:.0%}" for kind, rate in record["cache"].items())
+    logger.info("%s: %.3fs (%s); %s; cache hits %s", name, seconds, stages, counts, rates)
+
+    path = os.environ.get(PROFILE_FILE_ENV)
+    if path:
+        try:
+            with _lock, open(path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(record) + "\n")
+        except OSError as error:
+            logger.warning("Could not write the profile to %s: %s", path, error)
+    return record
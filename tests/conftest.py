@@ -0,0 +1,27 @@
+"""
+Loads the node package with the ``folder_paths`` stub of the benchmarks, so
+the tests run without ComfyUI, and keeps the glyph stores of every test in
+a temporary directory instead of the package's glyph_cache.
+"""
+import os
+import sys
+import pytest
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+if BENCH_DIR not in sys.path:
+    sys.path.insert(0, BENCH_DIR)
+
+from run_benchmarks import load_package  # noqa: E402
+
+load_package()
+
+
+@pytest.fixture(autouse=True)
+def glyph_store_dir(tmp_path, monkeypatch):
+    from ascii_art_nodes import glyph_store
+    from ascii_art_nodes.cache import CACHE
+    directory = tmp_path / "glyph_cache"
+    monkeypatch.setattr(glyph_store, "STORE_DIR", str(directory))
+    # Stores loaded by earlier tests point at their own directories
+    CACHE.clear()
+    return directory
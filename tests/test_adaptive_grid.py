@@ -0,0 +1,60 @@
+"""
+The adaptive grid: which blocks merge and how merged cells are laid out.
+"""
+import numpy as np
+from ascii_art_nodes.ascii_engine import AdaptiveSizes, merge_cells
+
+
+def detailed_colors(rows, cols):
+    # Neighbouring cells alternate between black and white, so no block is flat
+    colors = np.zeros((1, rows, cols, 3), dtype=np.uint8)
+    colors[0, (np.add.outer(np.arange(rows), np.arange(cols)) % 2) == 1] = 255
+    return colors
+
+
+def test_flat_blocks_merge_into_anchors():
+    colors = detailed_colors(8, 10)
+    colors[0, 0:4, 4:8] = 100    # flat 4x4 block, aligned
+    colors[0, 4:6, 0:2] = 30     # flat 2x2 block
+    colors[0, 6:8, 7:9] = 60     # flat but not aligned to the 2x2 grid
+    sizes = AdaptiveSizes(threshold=8.0).select(colors, None)
+
+    expected = np.ones((1, 8, 10), dtype=np.int64)
+    expected[0, 0:4, 4:8] = 0
+    expected[0, 0, 4] = 4
+    expected[0, 4:6, 0:2] = 0
+    expected[0, 4, 0] = 2
+    np.testing.assert_array_equal(sizes, expected)
+
+
+def test_threshold_decides_flatness():
+    colors = detailed_colors(4, 4)
+    colors[0, :2, :2] = [[[100] * 3, [110] * 3], [[100] * 3, [110] * 3]]
+    # The luma of the block has a standard deviation of 5
+    assert AdaptiveSizes(threshold=4.9).select(colors, None)[0, 0, 0] == 1
+    assert AdaptiveSizes(threshold=5.0).select(colors, None)[0, 0, 0] == 2
+
+
+def test_edge_cells_outside_whole_blocks_stay_single():
+    colors = np.full((1, 5, 6, 3), 80, dtype=np.uint8)
+    sizes = AdaptiveSizes().select(colors, None)
+    assert sizes[0, 0, 0] == 4 and sizes[0, 4, 0] == 1 and sizes[0, 0, 4] == 2 and sizes[0, 2, 4] == 2
+    np.testing.assert_array_equal(sizes[0, 4], 1)
+    # Every cell is either drawn or covered by exactly one anchor
+    covered = np.zeros((5, 6), dtype=np.int64)
+    for y, x in zip(*np.nonzero(sizes[0])):
+        size = sizes[0, y, x]
+        covered[y:y + size, x:x + size] += 1
+    np.testing.assert_array_equal(covered, 1)
+
+
+def test_merge_cells_sets_anchors_to_block_means():
+    sizes = np.ones((1, 4, 4), dtype=np.int64)
+    sizes[0, :2, :2] = [[2, 0], [0, 0]]
+    values = np.arange(16 * 3, dtype=np.uint8).reshape(1, 4, 4, 3)
+    merged = merge_cells(values, sizes)
+    # (0 + 3 + 12 + 15) / 4 = 7.5, rounded to even like np.round
+    np.testing.assert_array_equal(merged[0, 0, 0], np.round(values[0, :2, :2].reshape(4, 3).mean(axis=0)))
+    merged[0, 0, 0] = values[0, 0, 0]
+    np.testing.assert_array_equal(merged, values)
+    assert merged is not values
@@ -0,0 +1,53 @@
+"""
+The shared LRU cache: eviction by entry count and bytes, and reloading of
+changed files.
+"""
+import os
+from ascii_art_nodes.cache import LRUCache, file_version, load_character_sets
+
+
+def test_evicts_least_recently_used_by_count():
+    cache = LRUCache(max_entries=2, max_bytes=1 << 20)
+    for name in "ab":
+        cache.get(("kind", name, 0), lambda: name, len)
+    cache.get(("kind", "a", 0), lambda: "reloaded", len)
+    cache.get(("kind", "c", 0), lambda: "c", len)
+    assert len(cache) == 2 and cache.evictions == 1
+    assert cache.get(("kind", "a", 0), lambda: "reloaded", len) == "a"
+    assert cache.get(("kind", "b", 0), lambda: "reloaded", len) == "reloaded"
+
+
+def test_evicts_by_bytes():
+    cache = LRUCache(max_entries=100, max_bytes=10)
+    cache.get(("kind", "a", 0), lambda: "x" * 6, len)
+    cache.get(("kind", "b", 0), lambda: "x" * 6, len)
+    assert len(cache) == 1 and cache.nbytes == 6
+    # A single entry larger than the bound is still kept
+    cache.get(("kind", "c", 0), lambda: "x" * 20, len)
+    assert len(cache) == 1 and cache.nbytes == 20
+
+
+def test_counts_hits_and_misses():
+    cache = LRUCache()
+    for _ in range(3):
+        cache.get(("font", "a", 0), lambda: "a", len)
+    assert cache.stats()["hits"] == {"font": 2} and cache.stats()["misses"] == {"font": 1}
+
+
+def test_new_version_drops_older_entries():
+    cache = LRUCache()
+    cache.get(("glyph", "a", 1, "x"), lambda: "old x", len)
+    cache.get(("glyph", "a", 1, "y"), lambda: "old y", len)
+    cache.get(("glyph", "b", 1, "x"), lambda: "b", len)
+    assert cache.get(("glyph", "a", 2, "x"), lambda: "new x", len) == "new x"
+    assert len(cache) == 2
+
+
+def test_reloads_changed_file(tmp_path):
+    path = tmp_path / "sets.txt"
+    path.write_text("Set 1: ab\n", encoding="utf-8")
+    assert load_character_sets(str(path)) == ("ab",)
+    version = file_version(str(path))
+    path.write_text("Set 1: cd\nSet 2: ef\n", encoding="utf-8")
+    os.utime(path, ns=(version + 10 ** 9, version + 10 ** 9))
+    assert load_character_sets(str(path)) == ("cd", "ef")
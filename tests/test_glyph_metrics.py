@@ -0,0 +1,42 @@
+"""
+Character choice by measured glyph coverage and shape.
+"""
+import numpy as np
+from PIL import ImageFont
+from folder_paths import get_full_path
+from ascii_art_nodes.glyph_metrics import DESCRIPTOR_SIZE, density_lut, measure_glyphs, nearest_glyphs
+
+
+def test_density_lut_picks_the_closest_coverage():
+    coverage = np.array([0.0, 1.0, 0.5, 0.2])
+    lut = density_lut(coverage)
+    assert lut.shape == (256,)
+    assert lut[0] == 0 and lut[255] == 1 and lut[128] == 2 and lut[51] == 3
+    levels = np.arange(256) / 255.0
+    np.testing.assert_array_equal(np.abs(levels - coverage[lut]), np.abs(levels[:, None] - coverage).min(axis=1))
+
+
+def test_nearest_glyphs_matches_brute_force(monkeypatch):
+    rng = np.random.default_rng(3)
+    descriptors = rng.random((12, DESCRIPTOR_SIZE * DESCRIPTOR_SIZE))
+    targets = rng.random((1000, DESCRIPTOR_SIZE * DESCRIPTOR_SIZE)).astype(np.float32)
+    expected = ((targets[:, None, :] - descriptors[None].astype(np.float32)) ** 2).sum(axis=2).argmin(axis=1)
+    # Several chunks, the last one partial
+    monkeypatch.setattr("ascii_art_nodes.glyph_metrics.CHUNK_CELLS", 300)
+    result = nearest_glyphs(targets, descriptors)
+    assert result.dtype == np.int64
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_measure_glyphs_orders_by_ink():
+    font = ImageFont.truetype(get_full_path("font", "dejavu-sans.condensed-bold.ttf"), 24)
+    coverage, descriptors = measure_glyphs(font, " .:#")
+    assert coverage[0] == 0 and coverage[3] == 1
+    assert coverage[0] < coverage[1] < coverage[2] < coverage[3]
+    assert descriptors.shape == (4, DESCRIPTOR_SIZE * DESCRIPTOR_SIZE)
+    # Each descriptor keeps the rescaled coverage as its mean
+    np.testing.assert_allclose(descriptors.mean(axis=1), coverage)
+    # A period only has ink in the bottom row of the box, a colon also above it
+    period, colon = (descriptor.reshape(DESCRIPTOR_SIZE, DESCRIPTOR_SIZE) for descriptor in descriptors[1:3])
+    assert np.ptp(period[0]) == 0 and period[-1].max() > period[0].max()
+    assert colon[1].max() > period[1].max()
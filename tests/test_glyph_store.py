@@ -0,0 +1,119 @@
+"""
+The on-disk glyph store: round trips, rebuilding damaged files, recording
+glyphs from every source and pruning the directory.
+"""
+import os
+import struct
+import numpy as np
+import pytest
+from PIL import ImageFont
+from folder_paths import get_full_path
+from ascii_art_nodes import glyph_store
+from ascii_art_nodes.cache import CACHE
+from ascii_art_nodes.glyph_atlas import GlyphAtlas
+from ascii_art_nodes.glyph_metrics import measure_glyphs
+from ascii_art_nodes.glyph_store import MAGIC, PREFIX, VERSION, GlyphStore
+
+
+@pytest.fixture
+def font():
+    return ImageFont.truetype(get_full_path("font", "Chewy-Regular.ttf"), 16)
+
+
+def draw(font, charset):
+    atlas = GlyphAtlas()
+    for text in charset:
+        atlas.glyph_id(font, text, charset=charset)
+    atlas.save()
+
+
+def stored_texts(font, charset):
+    return sorted(GlyphStore(font, charset)._glyphs)
+
+
+def test_round_trip(font):
+    draw(font, "ab@")
+    store = GlyphStore(font, "ab@")
+    assert sorted(store._glyphs) == ["@", "a", "b"]
+    for text, (dx, dy, alpha) in store._glyphs.items():
+        expected = GlyphAtlas.rasterize(font, text)
+        for stored, rasterized in zip((dx, dy, alpha), expected):
+            np.testing.assert_array_equal(stored, rasterized)
+
+
+def corrupt(data):
+    data[-1] ^= 1
+
+
+def truncate(data):
+    del data[-3:]
+
+
+def other_version(data):
+    data[:PREFIX.size] = PREFIX.pack(MAGIC, VERSION + 1, struct.unpack_from("<Q", data, 16)[0])
+
+
+@pytest.mark.parametrize("damage", [corrupt, truncate, other_version])
+def test_damaged_store_is_rebuilt(font, damage, caplog):
+    draw(font, "ab")
+    path = GlyphStore(font, "ab").path
+    with open(path, 'rb') as file:
+        data = bytearray(file.read())
+    damage(data)
+    with open(path, 'wb') as file:
+        file.write(data)
+
+    assert stored_texts(font, "ab") == []
+    assert "Rebuilding glyph cache" in caplog.text
+    # Store instances are cached per process, so a new run is simulated by clearing the cache
+    CACHE.clear()
+    draw(font, "ab")
+    assert stored_texts(font, "ab") == ["a", "b"]
+
+
+def test_offsets_outside_the_glyph_box_are_rejected(font):
+    draw(font, "ab")
+    store = GlyphStore(font, "ab")
+    dx, dy, alpha = (np.array(array) for array in store._glyphs["a"])
+    dx[0] = 10 ** 8
+    store._write({**store._glyphs, "a": (dx, dy, alpha)})
+    assert stored_texts(font, "ab") == []
+
+
+def test_glyphs_from_the_shared_cache_are_stored(font):
+    draw(font, "ABC")
+    draw(font, "ABD")
+    assert stored_texts(font, "ABD") == ["A", "B", "D"]
+
+
+def test_measured_glyphs_are_stored(font):
+    measure_glyphs(font, "abc")
+    assert stored_texts(font, "abc") == ["a", "b", "c"]
+
+
+def test_stores_of_changed_fonts_are_removed(tmp_path, glyph_store_dir):
+    path = tmp_path / "font.ttf"
+    path.write_bytes(open(get_full_path("font", "Chewy-Regular.ttf"), 'rb').read())
+    draw(ImageFont.truetype(str(path), 16), "ab")
+    draw(ImageFont.truetype(str(path), 20), "ab")
+    assert len(os.listdir(glyph_store_dir)) == 2
+
+    version = os.stat(path).st_mtime_ns
+    with open(path, 'ab') as file:
+        file.write(b"\0" * 4)
+    os.utime(path, ns=(version + 10 ** 9, version + 10 ** 9))
+    draw(ImageFont.truetype(str(path), 16), "ab")
+    assert os.listdir(glyph_store_dir) == [os.path.basename(GlyphStore(ImageFont.truetype(str(path), 16), "ab").path)]
+
+
+def test_least_recently_used_stores_are_removed(font, glyph_store_dir, monkeypatch):
+    # Permutations of one set give stores of the same size
+    draw(font, "abc")
+    first = GlyphStore(font, "abc").path
+    monkeypatch.setattr(glyph_store, "MAX_STORE_BYTES", 2 * os.path.getsize(first))
+    os.utime(first, ns=(0, 0))
+    draw(font, "bca")
+    assert os.path.exists(first)
+    draw(font, "cab")
+    assert not os.path.exists(first)
+    assert len(os.listdir(glyph_store_dir)) == 2
@@ -0,0 +1,24 @@
+"""
+The option lists against the values the engine accepts.
+"""
+import pytest
+import torch
+from ascii_art_nodes.ascii_engine import CHAR_MAPPINGS, SIZE_SELECTIONS
+from ascii_art_nodes.batching import WorkerPool
+from ascii_art_nodes.options import CHAR_MAPPING_NAMES, SIZE_SELECTION_NAMES
+from ascii_art_nodes.preprocess import pixelate
+
+
+def test_registries_follow_the_option_lists():
+    assert list(CHAR_MAPPINGS) == CHAR_MAPPING_NAMES
+    assert list(SIZE_SELECTIONS) == SIZE_SELECTION_NAMES
+
+
+def test_unknown_pool_is_rejected():
+    with pytest.raises(ValueError, match="Unknown pool"):
+        WorkerPool(2, "processes")
+
+
+def test_unknown_sampling_is_rejected():
+    with pytest.raises(ValueError, match="Unknown sampling"):
+        pixelate(torch.rand(1, 16, 16, 3), 4, 1.0, 1.0, 1.0, sampling="middle")
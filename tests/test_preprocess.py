@@ -0,0 +1,37 @@
+"""
+Tensor preprocessing against the PIL pipeline it replaces.
+"""
+import numpy as np
+import pytest
+import torch
+from PIL import Image, ImageEnhance
+from ascii_art_nodes.preprocess import grid_size, pixelate
+
+
+def pil_pixelate(frame, pixel_size, aspect_ratio_correction, brightness, contrast):
+    image = Image.fromarray(frame, mode='RGB')
+    image = ImageEnhance.Brightness(image).enhance(brightness)
+    image = ImageEnhance.Contrast(image).enhance(contrast)
+    rows, cols = grid_size(image.height, image.width, pixel_size, aspect_ratio_correction)
+    return np.array(image.resize((cols, rows), resample=Image.NEAREST))
+
+
+@pytest.mark.parametrize("width, height, pixel_size, aspect_ratio_correction", [
+    (97, 61, 3, 1.0),
+    (128, 128, 8, 1.5),
+    (203, 77, 5, 0.7),
+    # More pixels than are converted at once
+    (1200, 900, 16, 1.0),
+])
+@pytest.mark.parametrize("brightness, contrast", [(1.0, 1.0), (0.6, 2.2), (1.7, 0.5)])
+def test_pixelate_matches_pil(width, height, pixel_size, aspect_ratio_correction, brightness, contrast):
+    rng = np.random.default_rng(width * height)
+    batch = rng.random((2, height, width, 3), dtype=np.float32)
+    # Float frames are converted like the nodes did before the tensor path
+    frames = (batch * 255).astype(np.uint8)
+    expected = np.stack([pil_pixelate(frame, pixel_size, aspect_ratio_correction, brightness, contrast) for frame in frames])
+
+    grid = pixelate(torch.from_numpy(batch), pixel_size, aspect_ratio_correction, brightness, contrast, sampling="center")
+    np.testing.assert_array_equal(grid, expected)
+    grid = pixelate(torch.from_numpy(frames), pixel_size, aspect_ratio_correction, brightness, contrast, sampling="center")
+    np.testing.assert_array_equal(grid, expected)
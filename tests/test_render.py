@@ -0,0 +1,122 @@
+"""
+Rendering through the glyph atlas against a plain ImageDraw.text loop, and
+the parallel and incremental renderers against a single render.
+"""
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+from folder_paths import get_full_path
+from ascii_art_nodes.ascii_engine import ASCIIGrid, render_frame, render_frames
+from ascii_art_nodes.incremental import IncrementalRenderer
+
+CHARSET = "@%#*+=-:. Ab"
+FONT_SIZE_MIN = 6
+
+
+@pytest.fixture(scope="module")
+def font_path():
+    return get_full_path("font", "Chewy-Regular.ttf")
+
+
+def random_grid(seed, frames, rows, cols, image_size, text_length=1, sizes=(1, 2, 3)):
+    rng = np.random.default_rng(seed)
+    chars = rng.integers(len(CHARSET), size=(frames, rows, cols, text_length), dtype=np.uint8)
+    colors = rng.integers(256, size=(frames, rows, cols, 3), dtype=np.uint8)
+    cell_sizes = rng.choice(sizes, size=(frames, rows, cols)).astype(np.uint8)
+    return ASCIIGrid(chars, colors, cell_sizes, CHARSET, image_size, "brightness", "fixed")
+
+
+def naive_render(grid, font_path, unique_positions=False, block=None):
+    """Draw every cell of the first frame with ImageDraw.text, as the nodes originally did."""
+    width, height = grid.image_size
+    rows, cols = grid.shape
+    image = Image.new('RGB', (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    if block is None:
+        cells = [(y, x) for y in range(rows) for x in range(cols)]
+    else:
+        cells = [(y, x) for by in range(0, rows, block) for bx in range(0, cols, block)
+                 for y in range(by, min(by + block, rows)) for x in range(bx, min(bx + block, cols))]
+    used_positions = set()
+    for y, x in cells:
+        position = (int(x * (width / cols)), int(y * (height / rows)))
+        if unique_positions:
+            if position in used_positions:
+                continue
+            used_positions.add(position)
+        size = int(grid.sizes[0, y, x])
+        if size == 0:
+            continue
+        text = "".join(CHARSET[index] for index in grid.chars[0, y, x])
+        font = ImageFont.truetype(font_path, FONT_SIZE_MIN * size)
+        draw.text(position, text, font=font, fill=tuple(int(c) for c in grid.colors[0, y, x]))
+    return np.array(image)
+
+
+@pytest.mark.parametrize("rows, cols, image_size, text_length, sizes, unique_positions, block", [
+    (12, 20, (160, 96), 1, (1, 2, 3), False, None),
+    (9, 14, (150, 100), 3, (1, 2, 3), False, None),
+    # Fewer pixels than cells, so positions repeat
+    (30, 45, (40, 26), 3, (1, 2, 3), True, None),
+    (17, 23, (184, 136), 1, (1,), False, 5),
+    (16, 24, (192, 128), 1, (0, 1, 2, 4), False, None),
+])
+def test_render_frame_matches_draw_text(font_path, rows, cols, image_size, text_length, sizes, unique_positions, block):
+    grid = random_grid(rows * cols, 1, rows, cols, image_size, text_length, sizes)
+    expected = naive_render(grid, font_path, unique_positions, block)
+    np.testing.assert_array_equal(render_frame(grid, font_path, FONT_SIZE_MIN, unique_positions, block), expected)
+
+
+@pytest.mark.parametrize("pool", ["thread", "process"])
+@pytest.mark.parametrize("frames", [1, 3])
+def test_parallel_render_matches_single(font_path, pool, frames):
+    # A single frame is split into tiles, several frames are rendered side by side
+    grid = random_grid(frames, frames, 40, 50, (300, 240))
+    expected = [render_frame(grid.frame(i), font_path, FONT_SIZE_MIN) for i in range(frames)]
+    rendered = list(render_frames(grid, font_path, FONT_SIZE_MIN, workers=4, pool=pool))
+    assert len(rendered) == frames
+    for image, single in zip(rendered, expected):
+        np.testing.assert_array_equal(image, single)
+
+
+@pytest.mark.parametrize("workers", [2, 3, 7])
+@pytest.mark.parametrize("block", [None, 6])
+def test_tiled_render_matches_single(font_path, workers, block):
+    # Large glyphs spill over the tile borders
+    grid = random_grid(workers, 1, 60, 40, (240, 420), sizes=(1, 3, 4))
+    expected = render_frame(grid, font_path, FONT_SIZE_MIN, block=block)
+    np.testing.assert_array_equal(render_frame(grid, font_path, FONT_SIZE_MIN, block=block, workers=workers), expected)
+
+
+def changing_grid(frames, block=None):
+    grid = random_grid(7, frames, 30, 40, (240, 180))
+    # Later frames only change a patch of cells and a few colors by one level
+    for i in range(1, frames):
+        grid.chars[i] = grid.chars[0]
+        grid.colors[i] = grid.colors[0]
+        grid.sizes[i] = grid.sizes[0]
+        grid.chars[i, 5 * i:5 * i + 6, 3 * i:3 * i + 8] = i
+        grid.colors[i, 20:22] += 1
+    return grid
+
+
+@pytest.mark.parametrize("block", [None, 6])
+def test_incremental_render_matches_single(font_path, block):
+    grid = changing_grid(4)
+    expected = [render_frame(grid.frame(i), font_path, FONT_SIZE_MIN, block=block) for i in range(len(grid))]
+    rendered = list(render_frames(grid, font_path, FONT_SIZE_MIN, block=block, incremental=True, change_tolerance=0))
+    for image, single in zip(rendered, expected):
+        np.testing.assert_array_equal(image, single)
+
+
+def test_incremental_render_skips_unchanged_cells(font_path):
+    grid = changing_grid(2)
+    renderer = IncrementalRenderer(tolerance=1)
+    first, second = (render_frame(grid.frame(i), font_path, FONT_SIZE_MIN, renderer=renderer) for i in range(2))
+    # The one-level color changes are within the tolerance, except where 255 wrapped to 0
+    changed = (grid.chars[1] != grid.chars[0]).any(axis=-1)
+    changed |= (np.abs(grid.colors[1].astype(np.int16) - grid.colors[0]) > 1).any(axis=-1)
+    assert renderer.cells_total == 2 * 30 * 40
+    assert renderer.cells_skipped == 30 * 40 - np.count_nonzero(changed)
+    grid.colors[1] = np.where(changed[..., None], grid.colors[1], grid.colors[0])
+    np.testing.assert_array_equal(second, render_frame(grid.frame(1), font_path, FONT_SIZE_MIN))
@@ -0,0 +1,71 @@
+"""
+Plain, ANSI and HTML export of ASCII grids, and the export node.
+"""
+import os
+import numpy as np
+import pytest
+from ascii_art_nodes.ascii_engine import ASCIIGrid
+from ascii_art_nodes.ascii_grid_nodes import ASCIIGridTextExportNode
+from ascii_art_nodes.text_export import color_runs, iter_text, write_text
+
+RED, BLUE = (255, 0, 0), (0, 0, 255)
+
+
+def small_grid():
+    # Two frames of 2x3 cells; the last cell of the first frame is merged into a neighbour
+    chars = np.array([[[0, 1, 2], [2, 3, 0]], [[1, 1, 1], [0, 0, 0]]], dtype=np.uint8)[..., None]
+    colors = np.array([[[RED, RED, BLUE], [BLUE, BLUE, BLUE]], [[RED] * 3, [RED] * 3]], dtype=np.uint8)
+    sizes = np.ones(chars.shape[:3], dtype=np.uint8)
+    sizes[0, 1, 2] = 0
+    return ASCIIGrid(chars, colors, sizes, "a<b&", (30, 20), "brightness", "fixed")
+
+
+def test_color_runs():
+    colors = np.array([RED, RED, BLUE, RED, RED, RED], dtype=np.uint8)
+    assert color_runs(colors) == [(0, 2), (2, 3), (3, 6)]
+    assert color_runs(colors[:1]) == [(0, 1)]
+
+
+def test_plain():
+    assert "".join(iter_text(small_grid(), "plain")) == "a<b\nb& \n\f\n<<<\naaa\n"
+
+
+def test_ansi():
+    red, blue, reset = "\x1b[38;2;255;0;0m", "\x1b[38;2;0;0;255m", "\x1b[0m\n"
+    assert "".join(iter_text(small_grid(), "ansi")) == (
+        "\x1b[2J"
+        f"\x1b[H{red}a<{blue}b{reset}{blue}b& {reset}"
+        f"\x1b[H{red}<<<{reset}{red}aaa{reset}")
+
+
+def test_html():
+    text = "".join(iter_text(small_grid(), "html"))
+    assert text.count("<pre>") == 2
+    assert ('<pre><span style="color:#ff0000">a&lt;</span><span style="color:#0000ff">b</span>\n'
+            '<span style="color:#0000ff">b&amp; </span>\n</pre>\n') in text
+    assert text.endswith('<span style="color:#ff0000">aaa</span>\n</pre>\n</body></html>\n')
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        iter_text(small_grid(), "rtf")
+
+
+def test_write_text(tmp_path):
+    path = tmp_path / "art.txt"
+    written = write_text(small_grid(), str(path), "plain")
+    assert path.read_text(encoding="utf-8") == "a<b\nb& \n\f\n<<<\naaa\n"
+    assert written == len("a<b\nb& \n\f\n<<<\naaa\n")
+
+
+def test_export_node_counts_up_and_stays_in_the_output_folder(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    node = ASCIIGridTextExportNode()
+    first, = node.export(small_grid(), "html", "art/frames")
+    second, = node.export(small_grid(), "ansi", "art/frames")
+    assert os.path.basename(first) == "frames_00001_.html"
+    assert os.path.basename(second) == "frames_00002_.ans"
+    assert os.path.dirname(first) == os.path.join(str(tmp_path), "output", "art")
+    for prefix in ("../outside", str(tmp_path / "outside")):
+        with pytest.raises(Exception, match="outside the output folder"):
+            node.export(small_grid(), "plain", prefix)
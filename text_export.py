@@ -0,0 +1,94 @@
+"""
+Text export of ASCII grids.
+
+An ASCIIGrid already holds the text and color of every cell, so it can be
+written out as text without rasterizing anything: as plain text, as text
+colored with 24-bit ANSI escape sequences for terminals, or as HTML. Every
+format is produced by a generator that yields the output a row at a time,
+so a long batch can be streamed to a file in bounded memory. Consecutive
+cells of the same color share one escape sequence or one ``<span>``.
+Font sizes are not part of the text output: every cell is one text cell,
+and the cells an adaptive grid merged into a larger one are spaces.
+
+Frames of a batch follow each other: plain text separates them with a
+form feed line, ANSI moves the cursor home before each frame so the file
+plays as an animation when printed to a terminal, and HTML puts each frame
+in its own ``<pre>``.
+"""
+import html
+from typing import Iterator, List, Tuple
+import numpy as np
+from .ascii_engine import ASCIIGrid
+from .options import TEXT_FORMATS
+
+HTML_HEAD = ('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><style>'
+             'body{background:#fff}pre{font-family:monospace;line-height:1}</style></head><body>\n')
+HTML_TAIL = '</body></html>\n'
+
+
+def cell_texts(grid: ASCIIGrid, index: int) -> np.ndarray:
+    """The text of every cell of frame ``index``, as a [rows, cols] array of str."""
+    table = np.array(list(grid.charset))
+    chars = grid.chars[index]
+    texts = table[chars[..., 0]]
+    for k in range(1, chars.shape[-1]):
+        texts = np.char.add(texts, table[chars[..., k]])
+    return np.where(grid.sizes[index] == 0, " " * chars.shape[-1], texts)
+
+
+def color_runs(colors: np.ndarray) -> List[Tuple[int, int]]:
+    """(start, end) of the runs of equal colors in a [cols, 3] row."""
+    starts = np.flatnonzero(np.any(np.diff(colors, axis=0) != 0, axis=1)) + 1
+    bounds = [0, *starts.tolist(), len(colors)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def iter_plain(grid: ASCIIGrid) -> Iterator[str]:
+    for index in range(len(grid)):
+        if index:
+            yield "\f\n"
+        for row in cell_texts(grid, index):
+            yield "".join(row) + "\n"
+
+
+def iter_ansi(grid: ASCIIGrid) -> Iterator[str]:
+    # Clear the screen once, then draw every frame from the top left corner
+    yield "\x1b[2J"
+    for index in range(len(grid)):
+        yield "\x1b[H"
+        for row, colors in zip(cell_texts(grid, index), grid.colors[index]):
+            line = []
+            for start, end in color_runs(colors):
+                r, g, b = colors[start].tolist()
+                line.append(f"\x1b[38;2;{r};{g};{b}m" + "".join(row[start:end]))
+            yield "".join(line) + "\x1b[0m\n"
+
+
+def iter_html(grid: ASCIIGrid) -> Iterator[str]:
+    yield HTML_HEAD
+    for index in range(len(grid)):
+        yield "<pre>"
+        for row, colors in zip(cell_texts(grid, index), grid.colors[index]):
+            line = []
+            for start, end in color_runs(colors):
+                r, g, b = colors[start].tolist()
+                line.append(f'<span style="color:#{r:02x}{g:02x}{b:02x}">{html.escape("".join(row[start:end]))}</span>')
+            yield "".join(line) + "\n"
+        yield "</pre>\n"
+    yield HTML_TAIL
+
+
+def iter_text(grid: ASCIIGrid, text_format: str) -> Iterator[str]:
+    """Yield ``grid`` as ``plain``, ``ansi`` or ``html`` text, a row at a time."""
+    if text_format not in TEXT_FORMATS:
+        raise ValueError(f"Unknown text format: {text_format}. Expected one of {', '.join(TEXT_FORMATS)}")
+    return {"plain": iter_plain, "ansi": iter_ansi, "html": iter_html}[text_format](grid)
+
+
+def write_text(grid: ASCIIGrid, path: str, text_format: str) -> int:
+    """Stream ``grid`` to the file at ``path`` and return the number of characters written."""
+    written = 0
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        for chunk in iter_text(grid, text_format):
+            written += file.write(chunk)
+    return written